@@ -6,6 +6,19 @@ Removes duplicate listings based on various criteria.
 import hashlib
 from typing import List, Dict, Any, Set
 
+import pandas as pd
+
+
+# Key fields for identifying duplicates
+KEY_FIELDS = (
+    'url',
+    'title',
+    'address',
+    'price',
+    'area_sqm',
+    'property_type'
+)
+
 
 def generate_listing_hash(listing: Dict[str, Any]) -> str:
     """
@@ -17,19 +30,9 @@ def generate_listing_hash(listing: Dict[str, Any]) -> str:
     Returns:
         Hash string for deduplication
     """
-    # Key fields for identifying duplicates
-    key_fields = [
-        'url',
-        'title', 
-        'address',
-        'price',
-        'area_sqm',
-        'property_type'
-    ]
-    
     # Create hash input string
     hash_input = ""
-    for field in key_fields:
+    for field in KEY_FIELDS:
         value = listing.get(field, "")
         if value is not None:
             hash_input += str(value).lower().strip()
@@ -51,17 +54,24 @@ def dedupe_records(listings: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     if not listings:
         return []
     
-    seen_hashes: Set[str] = set()
-    deduplicated = []
-    
-    for listing in listings:
-        listing_hash = generate_listing_hash(listing)
-        
-        if listing_hash not in seen_hashes:
-            seen_hashes.add(listing_hash)
-            deduplicated.append(listing)
+    keep = ~_listing_keys(listings).duplicated(keep='first')
+    return [listing for listing, kept in zip(listings, keep.to_numpy()) if kept]
+
+
+def _listing_keys(listings: List[Dict[str, Any]]) -> pd.Series:
+    """
+    Build the generate_listing_hash input string of every listing, column-wise.
     
-    return deduplicated
+    Equal keys are exactly the listings with equal hashes, so deduplication
+    can compare the keys directly instead of hashing each row in Python.
+    """
+    keys = pd.Series([""] * len(listings), dtype=object)
+    for field in KEY_FIELDS:
+        values = [listing.get(field, "") for listing in listings]
+        # str() per value, as generate_listing_hash does: no int -> float upcasting,
+        # and NaN becomes 'nan' (astype(str) keeps it missing under pandas >= 3)
+        keys = keys + pd.Series(["" if v is None else str(v).lower().strip() for v in values], dtype=object)
+    return keys
 
 
 def dedupe(listings: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
@@ -3,15 +3,75 @@ Geocoding utilities for the ETL pipeline.
 Handles address geocoding and neighborhood detection.
 """
 
+import functools
 import json
 import logging
+import shelve
+import time
 from pathlib import Path
-from typing import Optional, Tuple, Dict, Any
+from typing import Optional, Tuple, Dict, Any, List, Callable
 import requests
 
+try:
+    from shapely.geometry import Point, shape
+    from shapely.strtree import STRtree
+except ImportError:  # ray casting over every polygon instead
+    STRtree = None
+
+try:
+    import diskcache
+except ImportError:  # shelve-backed cache instead
+    diskcache = None
+
 
 logger = logging.getLogger(__name__)
 
+# Feature properties holding the neighborhood name, in lookup order
+NAME_FIELDS = ('nom', 'name', 'neighborhood', 'quartier', 'district')
+
+GEOCODE_CACHE_DIR = 'data/.geocode_cache'
+GEOCODE_CACHE_TTL = 30 * 86400  # seconds
+
+
+def search_address(address: str, timeout: int = 5) -> Optional[Tuple[float, float]]:
+    """
+    Geocode an address with Nominatim, without swallowing errors.
+    
+    Args:
+        address: Address string to geocode
+        timeout: Request timeout in seconds
+        
+    Returns:
+        Tuple of (latitude, longitude), or None when the service found no match
+        
+    Raises:
+        requests.RequestException: On timeouts, connection or HTTP errors (e.g. 429)
+    """
+    # Use Nominatim (OpenStreetMap) geocoding service
+    url = "https://nominatim.openstreetmap.org/search"
+    params = {
+        'q': address,
+        'format': 'json',
+        'limit': 1,
+        'countrycodes': 'fr',  # Focus on France
+    }
+    
+    headers = {
+        'User-Agent': 'ScrappingBot/1.0 (https://github.com/magicmaxmagic/ScrappingBot)'
+    }
+    
+    response = requests.get(url, params=params, headers=headers, timeout=timeout)
+    response.raise_for_status()
+    
+    data = response.json()
+    if data and len(data) > 0:
+        result = data[0]
+        lat = float(result['lat'])
+        lon = float(result['lon'])
+        return (lat, lon)
+    
+    return None
+
 
 def geocode_address(address: str, timeout: int = 5) -> Optional[Tuple[float, float]]:
     """
@@ -28,29 +88,7 @@ def geocode_address(address: str, timeout: int = 5) -> Optional[Tuple[float, flo
         return None
     
     try:
-        # Use Nominatim (OpenStreetMap) geocoding service
-        url = "https://nominatim.openstreetmap.org/search"
-        params = {
-            'q': address,
-            'format': 'json',
-            'limit': 1,
-            'countrycodes': 'fr',  # Focus on France
-        }
-        
-        headers = {
-            'User-Agent': 'ScrappingBot/1.0 (https://github.com/magicmaxmagic/ScrappingBot)'
-        }
-        
-        response = requests.get(url, params=params, headers=headers, timeout=timeout)
-        response.raise_for_status()
-        
-        data = response.json()
-        if data and len(data) > 0:
-            result = data[0]
-            lat = float(result['lat'])
-            lon = float(result['lon'])
-            return (lat, lon)
-    
+        return search_address(address, timeout)
     except Exception as e:
         logger.warning(f"Geocoding failed for address '{address}': {e}")
     
@@ -62,6 +100,137 @@ def geocode(address: str, timeout: int = 5) -> Optional[Tuple[float, float]]:
     return geocode_address(address, timeout)
 
 
+class GeocodeCache:
+    """
+    Persistent address -> coordinates cache around a geocoder.
+    
+    Keys are the normalized address; addresses the geocoder found no match for
+    are stored as an empty tuple so they are not queried again until expiry.
+    The geocoder must return None only for "no match" and raise on failures
+    (timeouts, rate limiting...): those are not cached, so the address is
+    retried on the next run. Uses diskcache when installed, a shelve file otherwise.
+    """
+    
+    def __init__(
+        self,
+        directory: str = GEOCODE_CACHE_DIR,
+        ttl: int = GEOCODE_CACHE_TTL,
+        geocoder: Callable[[str], Optional[Tuple[float, float]]] = search_address,
+    ):
+        Path(directory).mkdir(parents=True, exist_ok=True)
+        self.ttl = ttl
+        self.geocoder = geocoder
+        if diskcache is not None:
+            self._cache = diskcache.Cache(directory)
+        else:
+            self._cache = shelve.open(str(Path(directory) / 'geocode'))
+    
+    @staticmethod
+    def _key(address: str) -> str:
+        return ' '.join(address.split()).lower()
+    
+    def _get(self, key: str):
+        if diskcache is not None:
+            return self._cache.get(key)
+        entry = self._cache.get(key)
+        if entry is None or entry[0] < time.time():
+            return None
+        return entry[1]
+    
+    def _set(self, key: str, value) -> None:
+        if diskcache is not None:
+            self._cache.set(key, value, expire=self.ttl)
+        else:
+            self._cache[key] = (time.time() + self.ttl, value)
+    
+    def geocode(self, address: str) -> Optional[Tuple[float, float]]:
+        """Geocode an address, querying the geocoder only on a cache miss."""
+        if not address:
+            return None
+        
+        key = self._key(address)
+        coords = self._get(key)
+        if coords is None:
+            try:
+                coords = self.geocoder(address)
+            except Exception as e:
+                # Transient failure: answer "unknown" for now, but don't remember it
+                logger.warning(f"Geocoding failed for address '{address}': {e}")
+                return None
+            self._set(key, coords or ())
+        return coords or None
+    
+    def close(self) -> None:
+        self._cache.close()
+    
+    def __enter__(self) -> "GeocodeCache":
+        return self
+    
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+class NeighborhoodIndex:
+    """
+    Spatial index over the neighborhood polygons of a GeoJSON file.
+    
+    Built once, then each lookup queries an STRtree (O(log M)) instead of
+    ray casting against every polygon. Falls back to the linear scan when
+    shapely is not installed.
+    """
+    
+    def __init__(self, features: List[Dict[str, Any]]):
+        self.features: List[Dict[str, Any]] = []
+        self.names: List[str] = []
+        polygons = []
+        
+        for feature in features:
+            if (feature.get('geometry') or {}).get('type') != 'Polygon':
+                continue
+            properties = feature.get('properties') or {}
+            name = next((properties[f] for f in NAME_FIELDS if f in properties), None)
+            if name is None:
+                continue
+            if STRtree is not None:
+                try:
+                    polygons.append(shape(feature['geometry']))
+                except Exception as e:
+                    logger.warning(f"Skipping invalid neighborhood polygon {name!r}: {e}")
+                    continue
+            self.features.append(feature)
+            self.names.append(name)
+        
+        self._tree = STRtree(polygons) if STRtree is not None else None
+    
+    @classmethod
+    def from_geojson(cls, geojson_path: str) -> "NeighborhoodIndex":
+        """Load and index a GeoJSON FeatureCollection."""
+        with open(geojson_path, 'rb') as f:
+            geojson_data = json.load(f)
+        return cls(geojson_data.get('features', []))
+    
+    def lookup(self, latitude: float, longitude: float) -> Optional[str]:
+        """
+        Return the name of the neighborhood containing the point.
+        
+        When polygons overlap, the first one in file order wins.
+        """
+        if self._tree is None:
+            for feature, name in zip(self.features, self.names):
+                if point_in_polygon(latitude, longitude, feature):
+                    return name
+            return None
+        
+        hits = self._tree.query(Point(longitude, latitude), predicate='within')
+        return self.names[int(hits.min())] if len(hits) else None
+
+
+@functools.lru_cache(maxsize=8)
+def _load_index(geojson_path: str, mtime_ns: int) -> NeighborhoodIndex:
+    # mtime_ns is part of the cache key so an edited file is re-indexed
+    return NeighborhoodIndex.from_geojson(geojson_path)
+
+
 def neighborhood_from_geojson(
     latitude: float, 
     longitude: float, 
@@ -70,6 +239,8 @@ def neighborhood_from_geojson(
     """
     Find neighborhood from coordinates using a GeoJSON file.
     
+    The file is parsed and indexed once, then cached until it changes.
+    
     Args:
         latitude: Latitude coordinate
         longitude: Longitude coordinate
@@ -84,17 +255,8 @@ def neighborhood_from_geojson(
             logger.warning(f"GeoJSON file not found: {geojson_path}")
             return None
         
-        with open(geojson_file, 'r', encoding='utf-8') as f:
-            geojson_data = json.load(f)
-        
-        # Simple point-in-polygon check for each feature
-        for feature in geojson_data.get('features', []):
-            if point_in_polygon(latitude, longitude, feature):
-                # Try different property names for neighborhood
-                properties = feature.get('properties', {})
-                for name_field in ['nom', 'name', 'neighborhood', 'quartier', 'district']:
-                    if name_field in properties:
-                        return properties[name_field]
+        index = _load_index(str(geojson_file), geojson_file.stat().st_mtime_ns)
+        return index.lookup(latitude, longitude)
     
     except Exception as e:
         logger.warning(f"Error finding neighborhood: {e}")
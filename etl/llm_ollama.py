@@ -6,6 +6,7 @@ Provides intelligent data extraction from HTML content.
 import json
 import logging
 import requests
+from requests.adapters import HTTPAdapter
 from typing import Optional, Dict, Any
 from datetime import datetime
 
@@ -24,7 +25,8 @@ class OllamaExtractor:
         self, 
         base_url: str = "http://localhost:11434",
         model: str = "llama2",
-        timeout: int = 30
+        timeout: int = 30,
+        max_connections: int = 8
     ):
         """
         Initialize the Ollama extractor.
@@ -33,11 +35,18 @@ class OllamaExtractor:
             base_url: Ollama API base URL
             model: LLM model to use
             timeout: Request timeout in seconds
+            max_connections: Keep-alive connections kept open to Ollama
+                (at least the number of threads calling extract concurrently)
         """
         self.base_url = base_url.rstrip('/')
         self.model = model
         self.timeout = timeout
         self.session = requests.Session()
+        # One pooled keep-alive connection per concurrent caller, so parallel
+        # extractions reuse sockets instead of reconnecting
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_connections, pool_block=True)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
     
     def extract(
         self, 
@@ -4,7 +4,7 @@ Generates SQL for upserting listings into PostgreSQL.
 """
 
 import json
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Iterator
 from datetime import datetime
 
 
@@ -18,30 +18,47 @@ def generate_upsert_sql(listings: List[Dict[str, Any]]) -> str:
     Returns:
         SQL string with UPSERT statements
     """
-    if not listings:
-        return "-- No listings to insert\n"
+    return b"".join(generate_upsert_sql_iter(listings)).decode('utf-8')
+
+
+def generate_upsert_sql_iter(listings: List[Dict[str, Any]]) -> Iterator[bytes]:
+    """
+    Generate the same SQL as generate_upsert_sql as UTF-8 chunks.
     
-    sql_parts = [
-        "-- Generated UPSERT SQL for listings",
-        f"-- Generated at: {datetime.now().isoformat()}",
-        f"-- Total listings: {len(listings)}",
-        "",
-        "BEGIN;",
-        ""
-    ]
+    One chunk per listing, so callers can stream the script to a file
+    without holding the whole text (and its encoded copy) in memory.
     
-    for i, listing in enumerate(listings):
-        sql_parts.append(f"-- Listing {i+1}: {listing.get('url', 'unknown')}")
-        sql_parts.append(_generate_single_upsert(listing))
-        sql_parts.append("")
+    Args:
+        listings: List of listing dictionaries
+        
+    Yields:
+        UTF-8 encoded SQL fragments
+    """
+    if not listings:
+        yield b"-- No listings to insert\n"
+        return
+    
+    yield (
+        "-- Generated UPSERT SQL for listings\n"
+        f"-- Generated at: {datetime.now().isoformat()}\n"
+        f"-- Total listings: {len(listings)}\n"
+        "\n"
+        "BEGIN;\n"
+        "\n"
+    ).encode('utf-8')
     
-    sql_parts.extend([
-        "COMMIT;",
-        "",
+    for i, listing in enumerate(listings):
+        yield (
+            f"-- Listing {i+1}: {listing.get('url', 'unknown')}\n"
+            f"{_generate_single_upsert(listing)}\n"
+            "\n"
+        ).encode('utf-8')
+    
+    yield (
+        "COMMIT;\n"
+        "\n"
         f"-- Successfully processed {len(listings)} listings"
-    ])
-    
-    return "\n".join(sql_parts)
+    ).encode('utf-8')
 
 
 def _generate_single_upsert(listing: Dict[str, Any]) -> str:
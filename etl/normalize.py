@@ -4,7 +4,25 @@ Handles currency and area unit conversions.
 """
 
 import re
-from typing import Optional
+from typing import Optional, List, Sequence, Any
+
+import numpy as np
+
+# Conversion factors to square meters (first substring match wins)
+AREA_CONVERSIONS = {
+    "sqm": 1.0,
+    "m²": 1.0,
+    "m2": 1.0,
+    "square meters": 1.0,
+    "square metres": 1.0,
+    "sqft": 0.092903,  # Square feet to square meters
+    "ft²": 0.092903,
+    "ft2": 0.092903,
+    "square feet": 0.092903,
+    "acres": 4046.86,  # Acres to square meters
+    "hectares": 10000.0,  # Hectares to square meters
+    "ha": 10000.0,
+}
 
 
 def normalize_currency(currency: Optional[str]) -> str:
@@ -54,6 +72,24 @@ def normalize_currency(currency: Optional[str]) -> str:
     return "EUR"
 
 
+def normalize_currency_many(currencies: Sequence[Optional[str]]) -> List[str]:
+    """
+    Normalize a column of currency strings.
+    
+    Listings only use a handful of distinct spellings, so each one goes
+    through normalize_currency once and the rest are dictionary lookups.
+    """
+    codes = {}
+    normalized = []
+    for currency in currencies:
+        key = currency if currency is None or isinstance(currency, str) else str(currency)
+        code = codes.get(key)
+        if code is None:
+            code = codes[key] = normalize_currency(currency)
+        normalized.append(code)
+    return normalized
+
+
 def to_sqm(area: Optional[float], area_unit: Optional[str]) -> Optional[float]:
     """
     Convert area to square meters.
@@ -73,31 +109,68 @@ def to_sqm(area: Optional[float], area_unit: Optional[str]) -> Optional[float]:
     except (ValueError, TypeError):
         return None
     
+    factor = _sqm_factor(area_unit)
+    if factor is not None:
+        return round(area_value * factor, 2)
+    
+    # If no specific unit found, assume square meters
+    return area_value
+
+
+def _sqm_factor(area_unit: Any) -> Optional[float]:
+    """Conversion factor for a unit string, or None when no known unit matches."""
     unit = str(area_unit).lower().strip()
+    for key, factor in AREA_CONVERSIONS.items():
+        if key in unit:
+            return factor
+    return None
+
+
+def _area_value(area: Any, area_unit: Any) -> float:
+    # NaN marks the rows to_sqm would return None for
+    if not area or not area_unit:
+        return np.nan
+    try:
+        return float(area)
+    except (ValueError, TypeError):
+        return np.nan
+
+
+def to_sqm_many(areas: Sequence[Any], area_units: Sequence[Any]) -> List[Optional[float]]:
+    """
+    Convert whole columns of areas to square meters at once.
     
-    # Conversion factors to square meters
-    conversions = {
-        "sqm": 1.0,
-        "m²": 1.0,
-        "m2": 1.0,
-        "square meters": 1.0,
-        "square metres": 1.0,
-        "sqft": 0.092903,  # Square feet to square meters
-        "ft²": 0.092903,
-        "ft2": 0.092903,
-        "square feet": 0.092903,
-        "acres": 4046.86,  # Acres to square meters
-        "hectares": 10000.0,  # Hectares to square meters
-        "ha": 10000.0,
-    }
+    Same results as calling to_sqm row by row: each distinct unit string is
+    resolved once and the multiplication runs as one NumPy array operation,
+    but rounding stays in Python's round() (np.round rounds some half-cent
+    products differently).
     
-    # Find matching conversion
-    for key, factor in conversions.items():
-        if key in unit:
-            return round(area_value * factor, 2)
+    Args:
+        areas: Numeric area values
+        area_units: Unit of each area (sqm, sqft, etc.)
+        
+    Returns:
+        Areas in square meters, None where conversion is not possible
+    """
+    count = len(areas)
+    values = np.fromiter(
+        (_area_value(a, u) for a, u in zip(areas, area_units)), dtype=np.float64, count=count
+    )
     
-    # If no specific unit found, assume square meters
-    return area_value
+    factor_lut = {}
+    for unit in area_units:
+        key = str(unit)
+        if key not in factor_lut:
+            factor = _sqm_factor(unit)
+            factor_lut[key] = np.nan if factor is None else factor
+    factors = np.fromiter((factor_lut[str(u)] for u in area_units), dtype=np.float64, count=count)
+    
+    products = (values * factors).tolist()
+    # Unknown units are assumed to already be square meters (and left unrounded)
+    return [
+        None if v != v else v if f != f else round(p, 2)
+        for v, f, p in zip(values.tolist(), factors.tolist(), products)
+    ]
 
 
 def to_square_meters(area: Optional[float], area_unit: Optional[str]) -> Optional[float]:
@@ -3,9 +3,13 @@ Data validation and schema definitions for the ETL pipeline.
 Provides Pydantic models for listing validation.
 """
 
+import logging
 from typing import Optional, Dict, Any, List
 from datetime import datetime
-from pydantic import BaseModel, Field, validator, ValidationError
+from pydantic import BaseModel, Field, TypeAdapter, validator, ValidationError
+
+
+logger = logging.getLogger(__name__)
 
 
 class Listing(BaseModel):
@@ -132,6 +136,59 @@ def validate_listing(data: Dict[str, Any]) -> Optional[Listing]:
         return None
 
 
+_LISTINGS_ADAPTER = TypeAdapter(List[Listing])
+
+
+def validate_listings(listings: List[Dict[str, Any]]) -> List[Optional[Listing]]:
+    """
+    Validate many listings in one pydantic-core call.
+    
+    Same rules as validate_listing, but the whole list is validated natively
+    instead of building models one Python call at a time. Records that fail
+    are logged and come back as None, in place, so callers can retry them.
+    
+    Args:
+        listings: List of listing dictionaries
+        
+    Returns:
+        One validated Listing or None per input record
+    """
+    now = datetime.now()
+    for data in listings:
+        if isinstance(data, dict) and not data.get('scraped_at'):
+            data['scraped_at'] = now
+    
+    try:
+        return list(_LISTINGS_ADAPTER.validate_python(listings))
+    except ValidationError as e:
+        failed: Dict[int, List[str]] = {}
+        for err in e.errors():
+            field = '.'.join(map(str, err['loc'][1:]))
+            failed.setdefault(err['loc'][0], []).append(f"{field}: {err['msg']}" if field else err['msg'])
+    
+    for index, messages in failed.items():
+        data = listings[index]
+        url = data.get('url', 'unknown') if isinstance(data, dict) else 'unknown'
+        logger.warning(f"Listing validation failed for URL {url}: {'; '.join(messages)}")
+    
+    # Items are validated independently, so the remaining ones pass as a batch
+    valid_indices = [i for i in range(len(listings)) if i not in failed]
+    results: List[Optional[Listing]] = [None] * len(listings)
+    for index, listing in zip(valid_indices, _LISTINGS_ADAPTER.validate_python([listings[i] for i in valid_indices])):
+        results[index] = listing
+    return results
+
+
+def dump_listings(listings: List[Listing]) -> List[Dict[str, Any]]:
+    """
+    Convert validated listings back to dictionaries in one serializer call.
+    
+    None fields are left out; the SQL and dedupe steps treat missing and
+    None the same way.
+    """
+    return _LISTINGS_ADAPTER.dump_python(listings, exclude_none=True)
+
+
 def validate_batch(listings: List[Dict[str, Any]]) -> List[Listing]:
     """
     Validate a batch of listings.
@@ -142,14 +199,7 @@ def validate_batch(listings: List[Dict[str, Any]]) -> List[Listing]:
     Returns:
         List of validated Listing objects (invalid ones are filtered out)
     """
-    validated = []
-    
-    for listing_data in listings:
-        validated_listing = validate_listing(listing_data)
-        if validated_listing:
-            validated.append(validated_listing)
-    
-    return validated
+    return [listing for listing in validate_listings(listings) if listing is not None]
 
 
 def get_validation_stats(listings: List[Dict[str, Any]]) -> Dict[str, Any]:
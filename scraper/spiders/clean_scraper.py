@@ -6,9 +6,12 @@ Follows ethical scraping practices and ToS compliance
 """
 import asyncio
 import argparse
+import functools
 import json
 import logging
+import random
 import re
+import string
 import sys
 import time
 from datetime import datetime, timezone
@@ -18,20 +21,207 @@ from urllib.parse import urljoin, urlparse
 
 from playwright.async_api import async_playwright, Browser, Page, Response
 
-# Setup logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+try:
+    import hyperscan  # Optional SIMD multi-pattern matcher
+except ImportError:
+    hyperscan = None
+
+try:
+    # Optional C-level HTML parser for static DOM extraction
+    from selectolax.lexbor import LexborHTMLParser as HTMLParser
+except ImportError:
+    try:
+        from selectolax.parser import HTMLParser
+    except ImportError:
+        HTMLParser = None
+
+# Logging is configured by the CLI entrypoint, not on import
 logger = logging.getLogger(__name__)
 
+# Upper bound on browser/driver shutdown, so a hung close cannot outlive a caller's timeout
+TEARDOWN_TIMEOUT_SEC = 5
+
+# Resource types aborted during scrapes - never used for API capture or DOM extraction
+BLOCKED_RESOURCE_TYPES = frozenset({"image", "font", "media", "stylesheet"})
+
+# Common WAF patterns - DO NOT attempt to bypass
+WAF_PATTERNS = (
+    ("incapsula", "Incapsula protection"),
+    ("cloudflare", "Cloudflare protection"),
+    ("access denied", "Access denied"),
+    ("blocked", "Request blocked"),
+    ("captcha", "CAPTCHA required"),
+    ("incident id", "WAF incident"),
+    ("security check", "Security check"),
+    ("ddos protection", "DDoS protection"),
+    ("rate limit", "Rate limited"),
+    ("forbidden", "Forbidden access"),
+)
+# One capturing group per pattern, so match.lastindex identifies the signature
+_WAF_RE = re.compile("|".join(f"({re.escape(p)})" for p, _ in WAF_PATTERNS), re.IGNORECASE)
+
+# API endpoints worth capturing - ADAPT per source
+API_URL_PATTERNS = (
+    '/api/listing',
+    '/api/property',
+    'PropertySearch',
+    '/search/results',
+    'ajax/search',
+)
+_API_URL_RE = re.compile("|".join(f"({re.escape(p)})" for p in API_URL_PATTERNS), re.IGNORECASE)
+
+# Validators (ETag / Last-Modified) of previously scraped search pages
+ETAG_CACHE_PATH = Path(__file__).resolve().parents[2] / "logs" / "etag_cache.json"
+
+# URL building tables for build_search_url - ADAPT per source
+_NORM_TABLE = str.maketrans(string.ascii_uppercase + " ", string.ascii_lowercase + "-")
+_WHERE_PREFIX = {"lachine": "/qc/montreal", "montreal": "/qc/montreal"}
+_WHAT_SUFFIX = {"condo": "/condos-for-sale", "rent": "/real-estate-for-rent"}
+
+# DOM extraction selectors - ADAPT per source's HTML structure
+LISTING_SELECTORS = (
+    '[data-testid*="listing"]',
+    '[class*="listing-card"]',
+    '[class*="property-card"]',
+    '.listing',
+    '.property',
+    '[itemtype*="RealEstateListing"]',
+)
+PRICE_SELECTORS = ('[class*="price"]', '[data-testid*="price"]', '.price', '[class*="amount"]')
+ADDRESS_SELECTORS = ('[class*="address"]', '[data-testid*="address"]', '.address', '[class*="location"]')
+
+# Price parsing for normalize_listing - fr-CA prices use (narrow) no-break spaces as thousand separators
+_PRICE_SPACE_KILL = str.maketrans('', '', ' \u00a0\u202f')
+_PRICE_NUM_RE = re.compile(r'\d[\d,]*')
+
+# Navigation errors that are not worth retrying (DNS / TLS)
+PERMANENT_NAV_ERRORS = (
+    "ERR_NAME_NOT_RESOLVED",
+    "ERR_NAME_RESOLUTION_FAILED",
+    "ERR_CERT_",
+    "ERR_SSL_",
+)
+
+
+def _compile_hyperscan(patterns) -> Optional[Any]:
+    """Compile literal patterns into one caseless Hyperscan database (None without hyperscan)"""
+    if hyperscan is None:
+        return None
+    try:
+        db = hyperscan.Database()
+        db.compile(
+            expressions=[re.escape(p).encode("utf-8") for p in patterns],
+            ids=list(range(len(patterns))),
+            elements=len(patterns),
+            flags=[hyperscan.HS_FLAG_CASELESS | hyperscan.HS_FLAG_SINGLEMATCH] * len(patterns),
+        )
+        return db
+    except Exception as e:
+        logger.warning(f"Hyperscan compile failed, using re: {e}")
+        return None
+
+
+_WAF_HS_DB = _compile_hyperscan([p for p, _ in WAF_PATTERNS])
+_API_URL_HS_DB = _compile_hyperscan(API_URL_PATTERNS)
+
+
+def first_match(text: str, regex: "re.Pattern[str]", hs_db: Optional[Any] = None) -> Optional[int]:
+    """Index of the pattern matching `text` (Hyperscan when available, else the regex fallback)"""
+    if hs_db is not None:
+        hits: List[int] = []
+        
+        def on_match(pattern_id, start, end, flags, context):
+            hits.append(pattern_id)
+            return True  # Stop at the first hit
+            
+        try:
+            hs_db.scan(text.encode("utf-8", "ignore"), match_event_handler=on_match)
+        except hyperscan.error:
+            if not hits:
+                raise
+        return hits[0] if hits else None
+        
+    match = regex.search(text)
+    return match.lastindex - 1 if match else None
+
+
+def extract_static_listing(node, base_url: str) -> Optional[Dict]:
+    """Extract data from a selectolax listing node - mirrors extract_single_listing"""
+    data = {}
+    
+    for sel in PRICE_SELECTORS:
+        price_elem = node.css_first(sel)
+        price_text = price_elem.text(strip=True) if price_elem else ""
+        if price_text and ('$' in price_text or '€' in price_text):
+            data['price_raw'] = price_text
+            break
+            
+    for sel in ADDRESS_SELECTORS:
+        addr_elem = node.css_first(sel)
+        addr_text = addr_elem.text(strip=True) if addr_elem else ""
+        if len(addr_text) > 5:
+            data['address'] = addr_text
+            break
+            
+    link_elem = node.css_first('a[href]')
+    href = link_elem.attributes.get('href') if link_elem else None
+    if href:
+        data['url'] = urljoin(base_url, href)
+        
+    bed_elem = node.css_first('[class*="bed"], [data-testid*="bed"]')
+    bed_match = re.search(r'(\d+)', bed_elem.text()) if bed_elem else None
+    if bed_match:
+        data['bedrooms'] = int(bed_match.group(1))
+        
+    bath_elem = node.css_first('[class*="bath"], [data-testid*="bath"]')
+    bath_match = re.search(r'(\d+(?:\.\d+)?)', bath_elem.text()) if bath_elem else None
+    if bath_match:
+        data['bathrooms'] = float(bath_match.group(1))
+        
+    return data or None
+
+
+def normalize_slug(value: str) -> str:
+    """Lowercase, dash-separate and trim slashes - one C-level translate pass for ASCII input"""
+    slug = value.translate(_NORM_TABLE) if value.isascii() else value.lower().translate(_NORM_TABLE)
+    return slug.strip("/")
+
+
+def query_outputs(queries: List[Dict[str, Any]]) -> List[str]:
+    """Output file names for a batch of queries, unique across the batch.
+
+    A source used by a single query keeps its name; shared sources get a
+    where/what suffix (plus the query index if that still collides).
+    An explicit "output" key in a query is kept as-is.
+    """
+    sources = [q.get("source", "realtor") for q in queries]
+    names: List[str] = []
+    for i, (query, source) in enumerate(zip(queries, sources)):
+        if query.get("output"):
+            name = query["output"]
+        elif sources.count(source) == 1:
+            name = source
+        else:
+            suffix = normalize_slug(f"{query.get('where') or ''} {query.get('what') or ''}".strip()).replace("/", "-")
+            name = f"{source}-{suffix}" if suffix else f"{source}-{i}"
+        if name in names:
+            name = f"{name}-{i}"
+        names.append(name)
+    return names
+
 
 class RealEstateScraper:
     """Production-ready async real estate scraper with WAF detection"""
     
-    def __init__(self, headless: bool = True, timeout_ms: int = 30000, debug: bool = False):
+    def __init__(self, headless: bool = True, timeout_ms: int = 30000, debug: bool = False,
+                 screenshot_full: bool = False, static_dom: bool = True):
         self.headless = headless
         self.timeout_ms = timeout_ms
         self.debug = debug
+        self.screenshot_full = screenshot_full
+        self.static_dom = static_dom
         self.browser: Optional[Browser] = None
-        self.captured_api_data: List[Dict] = []
+        self.etag_cache: Dict[str, Dict[str, Any]] = self.load_etag_cache()
         self.start_time = time.time()
         
     async def __aenter__(self):
@@ -59,12 +249,19 @@ class RealEstateScraper:
         return self
         
     async def __aexit__(self, exc_type, exc_val, exc_tb):
-        if self.browser:
-            await self.browser.close()
-        await self.playwright.stop()
+        try:
+            if self.browser:
+                await asyncio.wait_for(self.browser.close(), timeout=TEARDOWN_TIMEOUT_SEC)
+        except asyncio.TimeoutError:
+            logger.warning("⚠️ Browser close timed out, stopping the driver")
+        finally:
+            # Stopping the driver also kills a browser that did not close in time
+            await asyncio.wait_for(self.playwright.stop(), timeout=TEARDOWN_TIMEOUT_SEC)
         
-    def build_search_url(self, where: str, what: str, when: str, start_url: Optional[str] = None) -> str:
-        """Build search URL from CLI args or use provided start_url"""
+    @staticmethod
+    @functools.lru_cache(maxsize=1024)
+    def build_search_url(where: str, what: str, when: str, start_url: Optional[str] = None) -> str:
+        """Build search URL from CLI args or use provided start_url (memoized)"""
         if start_url:
             return start_url
             
@@ -72,48 +269,76 @@ class RealEstateScraper:
         base_url = "https://www.realtor.ca"  # Example - change per source
         
         # Normalize location
-        where_clean = where.lower().replace(" ", "-").strip("/")
-        what_clean = what.lower().replace(" ", "-").strip("/")
+        where_clean = normalize_slug(where)
+        what_clean = normalize_slug(what)
         
-        # Build path based on source's URL structure
-        if "lachine" in where_clean or "montreal" in where_clean:
-            path = f"/qc/montreal/{where_clean}"
-        else:
-            path = f"/qc/{where_clean}"
-            
-        if "condo" in what_clean:
-            path += "/condos-for-sale"
-        elif "rent" in what_clean:
-            path += "/real-estate-for-rent"
-        else:
-            path += "/real-estate-for-sale"
+        # Build path based on source's URL structure - first keyword found wins
+        where_key = next((k for k in _WHERE_PREFIX if k in where_clean), None)
+        what_key = next((k for k in _WHAT_SUFFIX if k in what_clean), None)
+        path = f"{_WHERE_PREFIX.get(where_key, '/qc')}/{where_clean}{_WHAT_SUFFIX.get(what_key, '/real-estate-for-sale')}"
             
         return f"{base_url}{path}"
         
+    @staticmethod
+    def load_etag_cache() -> Dict[str, Dict[str, Any]]:
+        """Load {url: {etag, last_modified, preview}} validators from previous runs"""
+        try:
+            return json.loads(ETAG_CACHE_PATH.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return {}
+            
+    def remember_validators(self, url: str, response: Optional[Response], listings: Optional[List[Dict]] = None):
+        """Persist the page validators so the next run can send a conditional GET.
+
+        The page's own preview is stored with them: a 304 re-emits exactly what
+        this URL produced, whatever preview_{source}.json holds by then.
+        """
+        headers = response.headers if response is not None else {}
+        validators: Dict[str, Any] = {}
+        if headers.get("etag"):
+            validators["etag"] = headers["etag"]
+        if headers.get("last-modified"):
+            validators["last_modified"] = headers["last-modified"]
+        if validators and listings:
+            validators["preview"] = {"count": len(listings), "listings": listings[:20]}
+            self.etag_cache[url] = validators
+        elif self.etag_cache.pop(url, None) is None:
+            return
+        try:
+            ETAG_CACHE_PATH.parent.mkdir(exist_ok=True)
+            ETAG_CACHE_PATH.write_text(json.dumps(self.etag_cache, indent=2), encoding="utf-8")
+        except OSError as e:
+            logger.debug(f"Failed to write ETag cache: {e}")
+            
+    @staticmethod
+    async def _add_conditional_headers(route, validators: Dict[str, Any]) -> None:
+        """Route handler turning the search page request into a conditional GET"""
+        headers = dict(route.request.headers)
+        if validators.get("etag"):
+            headers["If-None-Match"] = validators["etag"]
+        if validators.get("last_modified"):
+            headers["If-Modified-Since"] = validators["last_modified"]
+        await route.continue_(headers=headers)
+        
+    @staticmethod
+    async def _block_static_resources(route) -> None:
+        """Route handler aborting images, fonts, media and stylesheets"""
+        if route.request.resource_type in BLOCKED_RESOURCE_TYPES:
+            await route.abort()
+        else:
+            await route.continue_()
+        
     async def detect_waf_block(self, page: Page) -> tuple[bool, str]:
         """Detect WAF blocks and return (is_blocked, reason)"""
         try:
             content = await page.content()
-            content_lower = content.lower()
-            
-            # Common WAF patterns - DO NOT attempt to bypass
-            waf_patterns = [
-                ("incapsula", "Incapsula protection"),
-                ("cloudflare", "Cloudflare protection"),
-                ("access denied", "Access denied"),
-                ("blocked", "Request blocked"),
-                ("captcha", "CAPTCHA required"),
-                ("incident id", "WAF incident"),
-                ("security check", "Security check"),
-                ("ddos protection", "DDoS protection"),
-                ("rate limit", "Rate limited"),
-                ("forbidden", "Forbidden access")
-            ]
             
-            for pattern, reason in waf_patterns:
-                if pattern in content_lower:
-                    logger.warning(f"WAF detected: {reason}")
-                    return True, reason
+            # Single case-insensitive multi-pattern scan - no lowercased copy of the whole page
+            hit = first_match(content, _WAF_RE, _WAF_HS_DB)
+            if hit is not None:
+                reason = WAF_PATTERNS[hit][1]
+                logger.warning(f"WAF detected: {reason}")
+                return True, reason
                     
             # Check for common blocked status codes
             if page.url.startswith("data:") or "about:blank" in page.url:
@@ -125,23 +350,17 @@ class RealEstateScraper:
             logger.error(f"WAF detection error: {e}")
             return True, f"Detection error: {e}"
             
-    async def capture_api(self, page: Page) -> List[Dict]:
-        """Capture API/XHR responses - ONLY if allowed by ToS"""
+    async def capture_api(self, page: Page, ready: Optional[asyncio.Event] = None) -> List[Dict]:
+        """Capture API/XHR responses - ONLY if allowed by ToS
+
+        `ready`, when given, is set as soon as the first API response is captured.
+        """
         captured_data = []
         
         async def handle_response(response: Response):
             try:
                 url = response.url
-                # ADAPT: Change API patterns per source
-                api_patterns = [
-                    '/api/listing',
-                    '/api/property',
-                    'PropertySearch',
-                    '/search/results',
-                    'ajax/search'
-                ]
-                
-                if any(pattern.lower() in url.lower() for pattern in api_patterns):
+                if first_match(url, _API_URL_RE, _API_URL_HS_DB) is not None:
                     if response.status == 200:
                         try:
                             json_data = await response.json()
@@ -152,6 +371,8 @@ class RealEstateScraper:
                                     "data": json_data,
                                     "timestamp": datetime.now(timezone.utc).isoformat()
                                 })
+                                if ready is not None:
+                                    ready.set()
                         except Exception as e:
                             logger.debug(f"Failed to parse JSON from {url}: {e}")
             except Exception as e:
@@ -165,17 +386,7 @@ class RealEstateScraper:
         listings = []
         
         try:
-            # ADAPT: Change selectors per source
-            listing_selectors = [
-                '[data-testid*="listing"]',
-                '[class*="listing-card"]',
-                '[class*="property-card"]',
-                '.listing',
-                '.property',
-                '[itemtype*="RealEstateListing"]'
-            ]
-            
-            for selector in listing_selectors:
+            for selector in LISTING_SELECTORS:
                 elements = await page.query_selector_all(selector)
                 if elements:
                     logger.info(f"Found {len(elements)} listings with selector: {selector}")
@@ -194,6 +405,33 @@ class RealEstateScraper:
             
         return listings
         
+    async def extract_dom_static(self, page: Page) -> List[Dict]:
+        """Extract listings from one HTML snapshot parsed locally with selectolax
+
+        Runs all selectors in-process instead of one CDP round trip per element.
+        Returns an empty list when selectolax is not installed.
+        """
+        if HTMLParser is None:
+            return []
+            
+        listings = []
+        try:
+            tree = HTMLParser(await page.content())
+            for selector in LISTING_SELECTORS:
+                nodes = tree.css(selector)
+                if nodes:
+                    logger.info(f"Found {len(nodes)} listings with selector: {selector} (static)")
+                    for node in nodes[:50]:
+                        listing_data = extract_static_listing(node, page.url)
+                        if listing_data:
+                            listings.append(listing_data)
+                    break  # Use first successful selector
+                    
+        except Exception as e:
+            logger.error(f"Static DOM extraction failed: {e}")
+            
+        return listings
+        
     async def extract_single_listing(self, element, base_url: str) -> Optional[Dict]:
         """Extract data from a single listing DOM element"""
         try:
@@ -202,14 +440,7 @@ class RealEstateScraper:
             # ADAPT: Change selectors per source's HTML structure
             
             # Extract price
-            price_selectors = [
-                '[class*="price"]',
-                '[data-testid*="price"]',
-                '.price',
-                '[class*="amount"]'
-            ]
-            
-            for sel in price_selectors:
+            for sel in PRICE_SELECTORS:
                 try:
                     price_elem = await element.query_selector(sel)
                     if price_elem:
@@ -221,14 +452,7 @@ class RealEstateScraper:
                     continue
                     
             # Extract address
-            addr_selectors = [
-                '[class*="address"]',
-                '[data-testid*="address"]',
-                '.address',
-                '[class*="location"]'
-            ]
-            
-            for sel in addr_selectors:
+            for sel in ADDRESS_SELECTORS:
                 try:
                     addr_elem = await element.query_selector(sel)
                     if addr_elem:
@@ -284,8 +508,8 @@ class RealEstateScraper:
             # Normalize price
             if 'price_raw' in listing:
                 price_text = listing['price_raw']
-                # Extract numeric value
-                price_match = re.search(r'[\d,]+', price_text.replace(' ', ''))
+                # Extract numeric value (drops regular, no-break and narrow no-break spaces)
+                price_match = _PRICE_NUM_RE.search(price_text.translate(_PRICE_SPACE_KILL))
                 if price_match:
                     try:
                         normalized['price'] = int(price_match.group().replace(',', ''))
@@ -317,17 +541,24 @@ class RealEstateScraper:
             
         return None
         
-    async def write_preview(self, listings: List[Dict], source: str, blocked: bool, strategy: str, error: Optional[str] = None):
-        """Write standardized preview JSON file"""
+    async def write_preview(self, listings: List[Dict], source: str, blocked: bool, strategy: str,
+                            error: Optional[str] = None, count: Optional[int] = None,
+                            output: Optional[str] = None, started: Optional[float] = None):
+        """Write standardized preview JSON file (count defaults to len(listings))
+
+        The file is preview_{output}.json, output defaulting to the source name.
+        elapsed_sec is measured from `started` (the scrape's own start time);
+        it defaults to the scraper's creation time.
+        """
         try:
             logs_dir = Path(__file__).resolve().parents[2] / "logs"
             logs_dir.mkdir(exist_ok=True)
             
-            elapsed_sec = round(time.time() - self.start_time, 2)
+            elapsed_sec = round(time.time() - (self.start_time if started is None else started), 2)
             
             preview_data = {
                 "timestamp": datetime.now(timezone.utc).isoformat(),
-                "count": len(listings),
+                "count": len(listings) if count is None else count,
                 "preview": listings[:20] if listings else [],  # First 20 items
                 "blocked": blocked,
                 "strategy": strategy,
@@ -338,7 +569,7 @@ class RealEstateScraper:
             if error:
                 preview_data["error"] = error
                 
-            preview_path = logs_dir / f"preview_{source}.json"
+            preview_path = logs_dir / f"preview_{output or source}.json"
             preview_path.write_text(
                 json.dumps(preview_data, indent=2, ensure_ascii=False), 
                 encoding="utf-8"
@@ -360,14 +591,27 @@ class RealEstateScraper:
             logs_dir = Path(__file__).resolve().parents[2] / "logs"
             logs_dir.mkdir(exist_ok=True)
             
-            # Save HTML
-            html_content = await page.content()
+            # Save HTML - prefer a CDP MHTML snapshot: one self-contained file with
+            # the page's styles and images. The snapshot still comes back through
+            # Python as a string, and is usually larger than page.content()
             html_path = logs_dir / f"debug_{source}_page.html"
-            html_path.write_text(html_content, encoding="utf-8")
+            try:
+                cdp = await page.context.new_cdp_session(page)
+                snapshot = await cdp.send("Page.captureSnapshot", {"format": "mhtml"})
+                await cdp.detach()
+                html_path = html_path.with_suffix(".mhtml")
+                html_path.write_text(snapshot["data"], encoding="utf-8")
+            except Exception as e:
+                logger.debug(f"MHTML snapshot unavailable, saving raw HTML: {e}")
+                html_path.write_bytes((await page.content()).encode("utf-8"))
             
-            # Save screenshot
-            screenshot_path = logs_dir / f"debug_{source}_screenshot.png"
-            await page.screenshot(path=str(screenshot_path), full_page=True)
+            # Save screenshot - viewport JPEG by default, full-page PNG only for forensic captures
+            if self.screenshot_full:
+                screenshot_path = logs_dir / f"debug_{source}_screenshot.png"
+                await page.screenshot(path=str(screenshot_path), full_page=True, type="png")
+            else:
+                screenshot_path = logs_dir / f"debug_{source}_screenshot.jpg"
+                await page.screenshot(path=str(screenshot_path), full_page=False, type="jpeg", quality=70)
             
             logger.info(f"Debug files saved: {html_path}, {screenshot_path}")
             
@@ -375,8 +619,14 @@ class RealEstateScraper:
             logger.warning(f"Debug file save failed: {e}")
             
     async def scrape(self, where: str, what: str, when: str, start_url: Optional[str] = None, 
-                    force_dom: bool = False, source: str = "realtor") -> Dict:
-        """Main scraping method"""
+                    force_dom: bool = False, source: str = "realtor", output: Optional[str] = None) -> Dict:
+        """Main scraping method
+
+        Output files are named after `output` (default: the source), so concurrent
+        scrapes of one source must each be given a distinct output name.
+        """
+        started = time.time()  # per scrape: scrape_many runs many on one scraper
+        output = output or source
         if not self.browser:
             raise RuntimeError("Browser not initialized - use async context manager")
             
@@ -397,60 +647,86 @@ class RealEstateScraper:
                 "Upgrade-Insecure-Requests": "1"
             }
         )
+        # Skip bytes never parsed for listing data; documents, scripts and XHR/fetch still load
+        await context.route("**/*", self._block_static_resources)
         
         page = await context.new_page()
         
+        # Conditional GET only when this URL's previous preview was kept with its validators
+        validators = self.etag_cache.get(search_url)
+        cached_preview = validators.get("preview") if validators else None
+        if cached_preview:
+            await page.route(search_url, functools.partial(self._add_conditional_headers, validators=validators))
+        
         try:
-            # Set up API capture if not forcing DOM
+            # Set up API capture if not forcing DOM - the list is filled per page,
+            # so concurrent scrapes never share captured responses
+            captured: List[Dict] = []
+            api_ready = asyncio.Event()
             if not force_dom:
-                await self.capture_api(page)
+                captured = await self.capture_api(page, api_ready)
             
             # Add random delay to simulate human behavior
             await asyncio.sleep(2 + (time.time() % 3))
             
             # Navigate to page with retries
             max_retries = 3
+            nav_response = None
             for attempt in range(max_retries):
                 try:
-                    await page.goto(search_url, wait_until="domcontentloaded", timeout=self.timeout_ms)
-                    logger.info(f"Page loaded: {page.url}")
+                    nav_response = await page.goto(search_url, wait_until="commit", timeout=self.timeout_ms)
+                    logger.info(f"Navigation committed: {page.url}")
                     break
                 except Exception as e:
-                    if attempt == max_retries - 1:
+                    # DNS/TLS failures won't heal on retry - fail fast
+                    if attempt == max_retries - 1 or any(err in str(e) for err in PERMANENT_NAV_ERRORS):
                         raise e
                     logger.warning(f"Navigation attempt {attempt + 1} failed, retrying...")
-                    await asyncio.sleep(5 + attempt * 2)
+                    # Exponential backoff with full jitter, capped
+                    await asyncio.sleep(random.uniform(0, min(30, 1.5 * 2 ** attempt)))
+            
+            # Unchanged since last run - skip extraction and re-emit this URL's previous preview
+            if cached_preview and nav_response is not None and nav_response.status == 304:
+                count = cached_preview["count"]
+                await self.write_preview(cached_preview["listings"], source, False, "not_modified",
+                                         count=count, output=output, started=started)
+                logger.info(f"Page not modified since last scrape - reused {count} listings")
+                return {"success": True, "count": count, "strategy": "not_modified", "blocked": False}
+            
+            # Event-driven wait: continue as soon as the first API response is captured
+            if not force_dom:
+                try:
+                    await asyncio.wait_for(api_ready.wait(), timeout=10)
+                except asyncio.TimeoutError:
+                    logger.info("No API response yet - falling back to DOM load")
+            try:
+                await page.wait_for_load_state("domcontentloaded", timeout=5000)
+            except Exception:
+                logger.info("DOM load timeout - continuing")
             
             # Simulate human behavior - scroll and mouse movements
             await page.mouse.move(100, 100)
             await asyncio.sleep(1)
-            await page.evaluate("window.scrollTo(0, document.body.scrollHeight / 4)")
+            # body can still be null here if the DOM load above timed out
+            await page.evaluate("document.body && window.scrollTo(0, document.body.scrollHeight / 4)")
             await asyncio.sleep(2)
             
             # Check for WAF block immediately
             is_blocked, block_reason = await self.detect_waf_block(page)
             if is_blocked:
-                await self.save_debug_files(page, source)
-                await self.write_preview([], source, True, "blocked", block_reason)
+                self.remember_validators(search_url, None)
+                await self.save_debug_files(page, output)
+                await self.write_preview([], source, True, "blocked", block_reason, output=output, started=started)
                 logger.warning(f"WAF blocked: {block_reason}")
                 return {"blocked": True, "reason": block_reason}
             
-            # Wait for dynamic content with longer timeout
-            try:
-                await page.wait_for_load_state("networkidle", timeout=15000)
-            except:
-                logger.info("Networkidle timeout - continuing")
-            
-            # Additional wait for API calls to complete
-            await asyncio.sleep(3 + (time.time() % 2))
-            
             listings = []
             strategy = "blocked"
             
             # Try API capture first (if allowed and not forced DOM)
-            if not force_dom and self.captured_api_data:
+            if not force_dom and captured:
                 logger.info("Processing captured API data")
-                for api_response in self.captured_api_data:
+                for api_response in captured:
                     # ADAPT: Parse API response structure per source
                     api_data = api_response.get('data', {})
                     results = (api_data.get('Results') or 
@@ -469,7 +745,10 @@ class RealEstateScraper:
             # Fallback to DOM extraction
             if not listings:
                 logger.info("No API data - extracting from DOM")
-                dom_listings = await self.extract_dom(page)
+                dom_listings = await self.extract_dom_static(page) if self.static_dom else []
+                if not dom_listings:
+                    # JS-heavy pages: query the live DOM through Playwright
+                    dom_listings = await self.extract_dom(page)
                 for item in dom_listings:
                     normalized = self.normalize_listing(item, "dom")
                     if normalized:
@@ -481,10 +760,11 @@ class RealEstateScraper:
                     strategy = "blocked"
             
             # Save debug files
-            await self.save_debug_files(page, source)
+            await self.save_debug_files(page, output)
             
             # Write preview
-            await self.write_preview(listings, source, False, strategy)
+            await self.write_preview(listings, source, False, strategy, output=output, started=started)
+            self.remember_validators(search_url, nav_response, listings)
             
             logger.info(f"Scraping completed: {len(listings)} listings via {strategy}")
             return {
@@ -496,38 +776,103 @@ class RealEstateScraper:
             
         except Exception as e:
             logger.error(f"Scraping failed: {e}")
-            await self.save_debug_files(page, source)
-            await self.write_preview([], source, False, "error", str(e))
+            self.remember_validators(search_url, None)
+            await self.save_debug_files(page, output)
+            await self.write_preview([], source, False, "error", str(e), output=output, started=started)
             return {"success": False, "error": str(e)}
             
         finally:
             await context.close()
 
+    async def scrape_many(self, queries: List[Dict[str, Any]], concurrency: int = 4) -> List[Union[Dict, BaseException]]:
+        """Run several scrapes on the shared browser, at most `concurrency` at a time.
+
+        Each query is a dict of `scrape` keyword arguments. Results are returned in
+        query order; a scrape that raises yields its exception instead of a dict.
+        Queries sharing a source get per-query output names (see query_outputs).
+        """
+        sem = asyncio.Semaphore(max(1, concurrency))
+        
+        async def one(query: Dict[str, Any]) -> Dict:
+            async with sem:
+                return await self.scrape(**{"when": "all", **query})
+                
+        queries = [{**q, "output": name} for q, name in zip(queries, query_outputs(queries))]
+        return await asyncio.gather(*(one(q) for q in queries), return_exceptions=True)
+
+
+def result_exit_code(result: Union[Dict, BaseException]) -> int:
+    """Log a scrape result and map it to the CLI exit code (0=ok, 1=failed, 2=blocked)"""
+    if isinstance(result, BaseException):
+        logger.error(f"❌ Failed: {result}")
+        return 1
+    if result.get("blocked"):
+        logger.warning(f"❌ Blocked by WAF: {result.get('reason')}")
+        return 2  # Blocked exit code
+    if result.get("success"):
+        logger.info(f"✅ Success: {result.get('count')} listings via {result.get('strategy')}")
+        return 0
+    logger.error(f"❌ Failed: {result.get('error')}")
+    return 1
+
+
+async def run_once(where: str, what: str, timeout_ms: int = 30000, **scrape_kwargs) -> int:
+    """Run a single scrape in-process and return its CLI exit code (used by the monitor health check)"""
+    try:
+        async with RealEstateScraper(timeout_ms=timeout_ms) as scraper:
+            result = await scraper.scrape(where=where, what=what, **scrape_kwargs)
+            return result_exit_code(result)
+    except Exception as e:
+        logger.error(f"❌ Critical error: {e}")
+        return 1
+
 
 async def main():
     """CLI entrypoint"""
     parser = argparse.ArgumentParser(description="Production real estate scraper")
-    parser.add_argument('--where', required=True, help='City/location to search')
-    parser.add_argument('--what', required=True, help='Property type (condo, house, etc)')
+    parser.add_argument('--where', help='City/location to search')
+    parser.add_argument('--what', help='Property type (condo, house, etc)')
     parser.add_argument('--when', default='all', help='Date filter (last_7_days, last_30_days, all)')
     parser.add_argument('--start_url', help='Direct URL to scrape (overrides where/what)')
     parser.add_argument('--source', default='realtor', help='Source name for output file')
+    parser.add_argument('--queries-file', help='JSON file with a list of queries (scrape kwargs) to run on one browser')
+    parser.add_argument('--concurrency', type=int, default=4, help='Max concurrent scrapes with --queries-file')
     parser.add_argument('--dom', action='store_true', help='Force DOM extraction only')
     parser.add_argument('--debug', action='store_true', help='Save HTML and screenshots')
+    parser.add_argument('--live-dom', action='store_true', help='Skip static HTML parsing and query the live DOM only')
+    parser.add_argument('--full-screenshot', action='store_true', help='Save full-page PNG screenshots in debug mode')
     parser.add_argument('--headless', action='store_true', default=True, help='Run headless')
     parser.add_argument('--timeout', type=int, default=30000, help='Page timeout (ms)')
     
     args = parser.parse_args()
     
-    logger.info(f"Starting scraper: {args.source} - {args.where} {args.what}")
+    queries = None
+    if args.queries_file:
+        queries = json.loads(Path(args.queries_file).read_text(encoding="utf-8"))
+        if not isinstance(queries, list):
+            parser.error("--queries-file must contain a JSON list of queries")
+        logger.info(f"Starting scraper: {len(queries)} queries from {args.queries_file}")
+    elif not (args.where and args.what):
+        parser.error("--where and --what are required unless --queries-file is given")
+    else:
+        logger.info(f"Starting scraper: {args.source} - {args.where} {args.what}")
     
     try:
         async with RealEstateScraper(
             headless=args.headless, 
             timeout_ms=args.timeout,
-            debug=args.debug
+            debug=args.debug,
+            screenshot_full=args.full_screenshot,
+            static_dom=not args.live_dom
         ) as scraper:
             
+            if queries is not None:
+                results = await scraper.scrape_many(queries, concurrency=args.concurrency)
+                codes = [result_exit_code(r) for r in results]
+                if 1 in codes:
+                    return 1
+                return 2 if 2 in codes else 0
+            
             result = await scraper.scrape(
                 where=args.where,
                 what=args.what, 
@@ -536,16 +881,7 @@ async def main():
                 force_dom=args.dom,
                 source=args.source
             )
-            
-            if result.get("blocked"):
-                logger.warning(f"❌ Blocked by WAF: {result.get('reason')}")
-                return 2  # Blocked exit code
-            elif result.get("success"):
-                logger.info(f"✅ Success: {result.get('count')} listings via {result.get('strategy')}")
-                return 0
-            else:
-                logger.error(f"❌ Failed: {result.get('error')}")
-                return 1
+            return result_exit_code(result)
                 
     except Exception as e:
         logger.error(f"❌ Critical error: {e}")
@@ -553,4 +889,5 @@ async def main():
 
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
     sys.exit(asyncio.run(main()))
@@ -5,28 +5,159 @@ Supports API interception and DOM fallback with WAF detection
 """
 import asyncio
 import argparse
-import json
+import functools
+import io
 import logging
 import re
+import string
 import sys
-import time
 from datetime import datetime, timezone
 from pathlib import Path
 from typing import Dict, List, Any, Optional, Union
 from urllib.parse import urljoin, urlparse
 
+import orjson
 from playwright.async_api import async_playwright, Browser, Page, Response
 
+try:
+    import ijson
+except ImportError:  # optional: stream Results[] without building the full payload
+    ijson = None
+
 # Setup logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Lowercase + space-to-dash in a single translate pass
+_NORM_TABLE = str.maketrans(string.ascii_uppercase + " ", string.ascii_lowercase + "-")
+
+
+def normalize_slug(value: str) -> str:
+    """Lowercase, dash-separate and trim slashes - one C-level translate pass for ASCII input"""
+    slug = value.translate(_NORM_TABLE) if value.isascii() else value.lower().translate(_NORM_TABLE)
+    return slug.strip("/")
+
+
+# Resource types irrelevant to XHR interception and DOM fallback
+BLOCKED_RESOURCE_TYPES = frozenset({"image", "media", "font", "stylesheet"})
+
+# Where listing arrays live in the various API payload shapes, probed in order
+LISTING_PATHS = (('Results',), ('listings',), ('data', 'listings'), ('properties',))
+
+
+def listings_at(data: Any, path: tuple) -> Optional[List]:
+    """Walk a key path into a JSON payload; returns the list found there if non-empty"""
+    for key in path:
+        data = data.get(key) if isinstance(data, dict) else None
+    return data if isinstance(data, list) and data else None
+
+
+def stream_results(body: bytes) -> List[Dict]:
+    """Stream the PropertySearch `Results` array item by item; [] if ijson is missing or nothing matched"""
+    if ijson is None:
+        return []
+    try:
+        return list(ijson.items(io.BytesIO(body), 'Results.item', use_float=True))
+    except Exception as e:
+        logger.debug(f"Streaming parse failed, falling back to full JSON: {e}")
+        return []
+
+
+# Listing API endpoints worth intercepting
+API_URL_RE = re.compile(r"PropertySearch|api/Listing")
+
+# Anti-bot / WAF markers, compiled once and matched case-insensitively
+WAF_RE = re.compile(
+    r"incapsula|incident|access denied|just a moment|cf-browser-verification|challenge-platform",
+    re.IGNORECASE,
+)
+# Title + visible text head is enough to spot a challenge page without serializing the DOM
+WAF_SNIPPET_JS = "() => (document.title + ' ' + (document.body ? document.body.innerText : '')).slice(0, 8192)"
+
+# Browser context settings, shared by every scrape
+USER_AGENT = "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36"
+VIEWPORT = {"width": 1920, "height": 1080}
+DEFAULT_HEADERS = {
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.9",
+    "Accept-Language": "en-US,en;q=0.9,fr;q=0.8",
+    "Accept-Encoding": "gzip, deflate, br",
+    "Cache-Control": "no-cache",
+    "Pragma": "no-cache",
+    "Sec-Fetch-Dest": "document",
+    "Sec-Fetch-Mode": "navigate",
+    "Sec-Fetch-Site": "none",
+    "Upgrade-Insecure-Requests": "1"
+}
+
+# DOM fallback selectors: listing containers, then price/address inside each card
+LISTING_SELECTORS = (
+    '[data-testid*="listing"]',
+    '[class*="listing"]',
+    '[data-cy*="listing"]',
+    '.property-card',
+    '.listing-card',
+    '[itemtype*="RealEstateListing"]'
+)
+LISTING_SELECTORS_BASIC = (
+    '[data-testid*="listing"]',
+    '[class*="listing"]',
+    '[class*="property"]',
+    '.property-card',
+    '.listing-card'
+)
+PRICE_SELECTORS = ('[class*="price"]', '[data-testid*="price"]', '.price')
+ADDRESS_SELECTORS = ('[class*="address"]', '[data-testid*="address"]', '.address')
+
+# Walks every listing card in one JS pass: first price containing "$", first address
+# longer than 5 chars and the first link, mirroring the old per-element probes
+BULK_EXTRACT_JS = """
+({sel, limit, priceSels, addrSels}) => {
+    const firstText = (el, sels, ok) => {
+        for (const s of sels) {
+            const node = el.querySelector(s);
+            const text = node && node.innerText && node.innerText.trim();
+            if (text && ok(text)) return text;
+        }
+        return null;
+    };
+    const out = [];
+    for (const el of Array.from(document.querySelectorAll(sel)).slice(0, limit)) {
+        const data = {};
+        const price = firstText(el, priceSels, t => t.includes('$'));
+        if (price) data.price = price;
+        const address = firstText(el, addrSels, t => t.length > 5);
+        if (address) data.address = address;
+        const link = el.querySelector('a[href]');
+        const href = link && link.getAttribute('href');
+        if (href) data.url = href;
+        if (data.price || data.address) out.push(data);
+    }
+    return out;
+}
+"""
+
+
 class RealtorXHRScraper:
+    # Search/filter/map controls that usually trigger the PropertySearch XHR
+    APPROACH_SELECTOR = ", ".join([
+        '[data-testid*="search"]',
+        'button[class*="search"]',
+        'button[class*="filter"]',
+        '[data-testid*="map"]',
+        'button[class*="map"]',
+    ])
+
     def __init__(self, headless: bool = True, timeout_ms: int = 30000):
         self.headless = headless
         self.timeout_ms = timeout_ms
         self.browser: Optional[Browser] = None
         self.captured_data: List[Dict] = []
+        # API path -> key path that held the listings last time
+        self._path_cache: Dict[str, tuple] = {}
+        # Listing Id/MlsNumber already captured (pagination and map pans replay the same Results)
+        self._seen_ids: set = set()
+        # Set by the response handler once the first listings are captured
+        self._listings_ready = asyncio.Event()
 
     async def __aenter__(self):
         self.playwright = await async_playwright().start()
@@ -41,12 +172,14 @@ class RealtorXHRScraper:
             await self.browser.close()
         await self.playwright.stop()
 
-    def build_search_url(self, where: str = "montreal/lachine", what: str = "condos-for-sale", when: str = "") -> str:
+    @staticmethod
+    @functools.lru_cache(maxsize=128)
+    def build_search_url(where: str = "montreal/lachine", what: str = "condos-for-sale", when: str = "") -> str:
         """Build realtor.ca search URL from CLI args"""
         base_url = "https://www.realtor.ca"
         
         # Normalize location
-        where_clean = where.lower().replace(" ", "-").strip("/")
+        where_clean = normalize_slug(where)
         if not where_clean.startswith("qc/"):
             where_clean = f"qc/{where_clean}"
         
@@ -55,34 +188,60 @@ class RealtorXHRScraper:
         if when:
             path_parts.append(when)
         
-        url = f"{base_url}/{'/'.join(path_parts)}"
-        logger.info(f"Built search URL: {url}")
-        return url
+        return f"{base_url}/{'/'.join(path_parts)}"
+
+    def _add_listings(self, listings: List) -> int:
+        """Append listings not seen yet (keyed on Id or MlsNumber); returns how many were added"""
+        added = 0
+        for listing in listings:
+            lid = (listing.get('Id') or listing.get('MlsNumber')) if isinstance(listing, dict) else None
+            if lid is not None:
+                if lid in self._seen_ids:
+                    continue
+                self._seen_ids.add(lid)
+            self.captured_data.append(listing)
+            added += 1
+        if added:
+            self._listings_ready.set()
+        return added
 
     async def intercept_api_calls(self, page: Page):
         """Set up response interception for PropertySearch API calls"""
         
         async def handle_response(response: Response):
             try:
+                # Status first (cheapest), so redirects/errors skip the URL scan and body read
+                if response.status != 200:
+                    return
                 url = response.url
-                if ('PropertySearch' in url or 'api/Listing' in url) and response.status == 200:
+                if API_URL_RE.search(url):
                     logger.info(f"Intercepted API call: {url}")
                     
                     try:
-                        json_data = await response.json()
+                        body = await response.body()
+                        listings = stream_results(body)
+                        if listings:
+                            added = self._add_listings(listings)
+                            logger.info(f"Found {len(listings)} listings in API response ({added} new)")
+                            return
+
+                        # Full parse only when streaming found nothing (other shapes / debug dump)
+                        json_data = orjson.loads(body)
                         if isinstance(json_data, dict):
-                            # Look for listings array in various possible paths
-                            listings = (
-                                json_data.get('Results', []) or
-                                json_data.get('listings', []) or 
-                                json_data.get('data', {}).get('listings', []) or
-                                json_data.get('properties', []) or
-                                []
-                            )
+                            # Look for listings array, trying the path that worked for this endpoint first
+                            endpoint = urlparse(url).path
+                            cached_path = self._path_cache.get(endpoint)
+                            listings = listings_at(json_data, cached_path) if cached_path else None
+                            if listings is None:
+                                for path in LISTING_PATHS:
+                                    listings = listings_at(json_data, path)
+                                    if listings:
+                                        self._path_cache[endpoint] = path
+                                        break
                             
-                            if listings and isinstance(listings, list):
-                                logger.info(f"Found {len(listings)} listings in API response")
-                                self.captured_data.extend(listings)
+                            if listings:
+                                added = self._add_listings(listings)
+                                logger.info(f"Found {len(listings)} listings in API response ({added} new)")
                             else:
                                 logger.info(f"API response structure: {list(json_data.keys())}")
                                 # Save full response for debugging
@@ -98,6 +257,14 @@ class RealtorXHRScraper:
 
         page.on("response", handle_response)
         
+    @staticmethod
+    async def _block_static_resources(route) -> None:
+        """Route handler aborting images, media, fonts and stylesheets"""
+        if route.request.resource_type in BLOCKED_RESOURCE_TYPES:
+            await route.abort()
+        else:
+            await route.continue_()
+
     async def save_html_fallback(self, page: Page):
         """Save HTML fallback for debugging"""
         try:
@@ -113,82 +280,32 @@ class RealtorXHRScraper:
             
     async def extract_dom_fallback_basic(self, page: Page):
         """Fallback DOM extraction if API interception fails (basic version)"""
+        await self._extract_dom_with(page, LISTING_SELECTORS_BASIC)
+
+    async def _bulk_extract(self, page: Page, container_selector: str) -> List[Dict]:
+        """Extract price/address/url of every container in a single page.evaluate round trip"""
+        return await page.evaluate(BULK_EXTRACT_JS, {
+            "sel": container_selector,
+            "limit": 20,
+            "priceSels": PRICE_SELECTORS,
+            "addrSels": ADDRESS_SELECTORS,
+        })
+
+    async def _extract_dom_with(self, page: Page, selectors: tuple):
+        """Run the bulk extractor over each container selector until one matches"""
         try:
-            # Look for common listing container patterns
-            selectors = [
-                '[data-testid*="listing"]',
-                '[class*="listing"]',
-                '[class*="property"]',
-                '.property-card',
-                '.listing-card'
-            ]
-            
             for selector in selectors:
                 try:
-                    elements = await page.query_selector_all(selector)
-                    if elements:
-                        logger.info(f"Found {len(elements)} elements with selector: {selector}")
-                        
-                        for element in elements[:20]:  # Limit to avoid timeouts
-                            try:
-                                listing = await self.extract_listing_data_basic(element)
-                                if listing and (listing.get('price') or listing.get('address')):
-                                    self.captured_data.append(listing)
-                            except Exception as e:
-                                logger.debug(f"Failed to extract listing data: {e}")
-                        break
-                except:
+                    listings = await self._bulk_extract(page, selector)
+                except Exception as e:
+                    logger.debug(f"Bulk extraction failed for {selector}: {e}")
                     continue
-                    
+                if listings:
+                    logger.info(f"Found {len(listings)} listings with selector: {selector}")
+                    self.captured_data.extend(listings)
+                    break
         except Exception as e:
             logger.warning(f"DOM fallback extraction failed: {e}")
-            
-    async def extract_listing_data_basic(self, element) -> Optional[Dict]:
-        """Extract listing data from a DOM element (basic fallback)"""
-        try:
-            data = {}
-            
-            # Try to extract price
-            price_selectors = ['[class*="price"]', '[data-testid*="price"]', '.price']
-            for sel in price_selectors:
-                try:
-                    price_elem = await element.query_selector(sel)
-                    if price_elem:
-                        price_text = await price_elem.inner_text()
-                        if price_text and '$' in price_text:
-                            data['price'] = price_text.strip()
-                            break
-                except:
-                    continue
-                    
-            # Try to extract address
-            addr_selectors = ['[class*="address"]', '[data-testid*="address"]', '.address']
-            for sel in addr_selectors:
-                try:
-                    addr_elem = await element.query_selector(sel)
-                    if addr_elem:
-                        addr_text = await addr_elem.inner_text()
-                        if addr_text and len(addr_text.strip()) > 5:
-                            data['address'] = addr_text.strip()
-                            break
-                except:
-                    continue
-            
-            # Try to extract link/URL
-            try:
-                link_elem = await element.query_selector('a[href]')
-                if link_elem:
-                    href = await link_elem.get_attribute('href')
-                    if href:
-                        data['url'] = href
-            except:
-                pass
-                
-            return data if data else None
-            
-        except Exception as e:
-            logger.debug(f"Element extraction failed: {e}")
-            return None
 
     async def scrape_listings(self, where: str = "", what: str = "", when: str = "") -> List[Dict]:
         """Main scraping method"""
@@ -196,25 +313,18 @@ class RealtorXHRScraper:
             raise RuntimeError("Browser not initialized")
             
         search_url = self.build_search_url(where, what, when)
+        logger.info(f"Built search URL: {search_url}")
         logger.info(f"Navigating to: {search_url}")
         
         context = await self.browser.new_context(
-            user_agent="Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36",
-            viewport={"width": 1920, "height": 1080},
-            extra_http_headers={
-                "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.9",
-                "Accept-Language": "en-US,en;q=0.9,fr;q=0.8",
-                "Accept-Encoding": "gzip, deflate, br",
-                "Cache-Control": "no-cache",
-                "Pragma": "no-cache",
-                "Sec-Fetch-Dest": "document",
-                "Sec-Fetch-Mode": "navigate",
-                "Sec-Fetch-Site": "none",
-                "Upgrade-Insecure-Requests": "1"
-            }
+            user_agent=USER_AGENT,
+            viewport=VIEWPORT,
+            extra_http_headers=DEFAULT_HEADERS
         )
         
         page = await context.new_page()
+        # Skip imagery/fonts/CSS; documents, scripts and XHR (PropertySearch) still go through
+        await page.route("**/*", self._block_static_resources)
         
         # Set up response interception for multiple API patterns
         await self.intercept_api_calls(page)
@@ -227,8 +337,8 @@ class RealtorXHRScraper:
             await asyncio.sleep(5)
             
             # Check if we hit protection and try to wait it out
-            page_content = await page.content()
-            if "incapsula" in page_content.lower() or "incident" in page_content.lower():
+            snippet = await page.evaluate(WAF_SNIPPET_JS)
+            if WAF_RE.search(snippet or ""):
                 logger.warning("Detected anti-bot protection, waiting longer...")
                 await asyncio.sleep(10)
                 
@@ -239,34 +349,26 @@ class RealtorXHRScraper:
                 except:
                     logger.info("Reload failed, continuing with current page state")
             
-            # Wait for page to fully load
-            await page.wait_for_load_state("networkidle", timeout=20000)
-            logger.info(f"Page loaded: {page.url}")
+            # Wait for the first listings to be captured rather than networkidle
+            # (analytics polling keeps the network busy long after the XHR arrived)
+            if await self._wait_for_listings():
+                logger.info(f"Listings captured: {page.url}")
+            else:
+                logger.info(f"No listings captured yet: {page.url}")
             
             # Try to find and interact with search/listing elements
             try:
                 # Wait for potential React/Vue app to initialize
                 await asyncio.sleep(5)
                 
-                # Try different approaches to trigger API calls
-                approaches = [
-                    # Scroll to trigger lazy loading
-                    lambda: page.evaluate("window.scrollTo(0, document.body.scrollHeight)"),
-                    # Try to click search or filter buttons
-                    lambda: self.try_click_element(page, '[data-testid*="search"]'),
-                    lambda: self.try_click_element(page, 'button[class*="search"]'),
-                    lambda: self.try_click_element(page, 'button[class*="filter"]'),
-                    # Try to trigger map view which often loads listings
-                    lambda: self.try_click_element(page, '[data-testid*="map"]'),
-                    lambda: self.try_click_element(page, 'button[class*="map"]'),
-                ]
-                
-                for approach in approaches:
-                    try:
-                        await approach()
+                # Scroll to trigger lazy loading, then click the first visible
+                # search/filter/map control to trigger API calls
+                try:
+                    await page.evaluate("window.scrollTo(0, document.body.scrollHeight)")
+                    if await self.try_click_element(page, self.APPROACH_SELECTOR):
                         await asyncio.sleep(2)
-                    except Exception as e:
-                        logger.debug(f"Approach failed: {e}")
+                except Exception as e:
+                    logger.debug(f"Approach failed: {e}")
                         
                 # Final scroll and wait
                 for i in range(3):
@@ -296,98 +398,29 @@ class RealtorXHRScraper:
         logger.info(f"Captured {len(self.captured_data)} API responses/listings")
         return self.captured_data
         
+    async def _wait_for_listings(self, timeout: float = 20) -> bool:
+        """Wait until the response handler captures listings or the timeout (seconds) expires"""
+        try:
+            await asyncio.wait_for(self._listings_ready.wait(), timeout=timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
     async def try_click_element(self, page: Page, selector: str):
-        """Try to click an element if it exists and is visible"""
+        """Click the first visible element matching selector (may be a selector union)"""
         try:
-            element = await page.query_selector(selector)
-            if element and await element.is_visible():
-                await element.click()
-                logger.debug(f"Clicked element: {selector}")
-                return True
+            for element in await page.query_selector_all(selector):
+                if await element.is_visible():
+                    await element.click()
+                    logger.debug(f"Clicked element: {selector}")
+                    return True
         except:
             pass
         return False
         
     async def extract_dom_fallback(self, page: Page):
         """Fallback DOM extraction if API interception fails"""
-        try:
-            # Look for common listing container patterns
-            selectors = [
-                '[data-testid*="listing"]',
-                '[class*="listing"]',
-                '[data-cy*="listing"]',
-                '.property-card',
-                '.listing-card',
-                '[itemtype*="RealEstateListing"]'
-            ]
-            
-            for selector in selectors:
-                try:
-                    elements = await page.query_selector_all(selector)
-                    if elements:
-                        logger.info(f"Found {len(elements)} elements with selector: {selector}")
-                        
-                        for element in elements[:20]:  # Limit to avoid timeouts
-                            try:
-                                # Extract basic listing data
-                                listing = await self.extract_listing_data(element)
-                                if listing is not None and (listing.get('price') or listing.get('address')):
-                                    self.captured_data.append(listing)
-                            except Exception as e:
-                                logger.debug(f"Failed to extract listing data: {e}")
-                        break
-                except:
-                    continue
-                    
-        except Exception as e:
-            logger.warning(f"DOM fallback extraction failed: {e}")
-            
-    async def extract_listing_data(self, element) -> Optional[Dict]:
-        """Extract listing data from a DOM element"""
-        try:
-            data = {}
-            
-            # Try to extract price
-            price_selectors = ['[class*="price"]', '[data-testid*="price"]', '.price']
-            for sel in price_selectors:
-                try:
-                    price_elem = await element.query_selector(sel)
-                    if price_elem:
-                        price_text = await price_elem.inner_text()
-                        if price_text and '$' in price_text:
-                            data['price'] = price_text.strip()
-                            break
-                except:
-                    continue
-                    
-            # Try to extract address
-            addr_selectors = ['[class*="address"]', '[data-testid*="address"]', '.address']
-            for sel in addr_selectors:
-                try:
-                    addr_elem = await element.query_selector(sel)
-                    if addr_elem:
-                        addr_text = await addr_elem.inner_text()
-                        if addr_text and len(addr_text.strip()) > 5:
-                            data['address'] = addr_text.strip()
-                            break
-                except:
-                    continue
-            
-            # Try to extract link/URL
-            try:
-                link_elem = await element.query_selector('a[href]')
-                if link_elem:
-                    href = await link_elem.get_attribute('href')
-                    if href:
-                        data['url'] = href
-            except:
-                pass
-                
-            return data if data else None
-            
-        except Exception as e:
-            logger.debug(f"Element extraction failed: {e}")
-            return None
+        await self._extract_dom_with(page, LISTING_SELECTORS)
 
     async def save_preview(self, data: List[Dict], output_file: str = "logs/preview_realtor.json"):
         """Save captured data as preview JSON"""
@@ -395,17 +428,18 @@ class RealtorXHRScraper:
         output_path.parent.mkdir(parents=True, exist_ok=True)
         
         # Limit preview to first 50 items for performance
-        preview_data = data[:50] if len(data) > 50 else data
+        preview_data = data[:50]
         
-        with output_path.open('w', encoding='utf-8') as f:
-            json.dump({
-                "timestamp": asyncio.get_event_loop().time(),
-                "total_captured": len(data),
-                "preview_count": len(preview_data),
-                "data": preview_data
-            }, f, indent=2, ensure_ascii=False)
+        # Serialize fully in memory, then hand the buffer to the OS in one write
+        buf = orjson.dumps({
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "total_captured": len(data),
+            "preview_count": len(preview_data),
+            "data": preview_data
+        }, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+        output_path.write_bytes(buf)
         
-        logger.info(f"Saved preview to: {output_path}")
+        logger.info(f"Saved preview to: {output_path} ({len(buf)} bytes)")
         return str(output_path)
 
 
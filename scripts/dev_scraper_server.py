@@ -1,75 +1,287 @@
 #!/usr/bin/env python3
-import json
+import concurrent.futures
+import itertools
 import os
+import signal
 import subprocess
-from http.server import BaseHTTPRequestHandler, HTTPServer
+import tempfile
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
 import urllib.request
 import threading
+from urllib.parse import urlparse, parse_qs
+
+import urllib3
+
+try:
+    import fcntl
+except ImportError:  # Windows: in-process JOB_LOCK only
+    fcntl = None
+
+try:
+    import ijson
+except ImportError:  # full parse of listings.json for the last_run preview
+    ijson = None
+
+try:
+    import orjson
+    _dumps = orjson.dumps
+    _loads = orjson.loads
+except ImportError:  # stdlib fallback; same bytes-in/bytes-out contract
+    import json
+    _loads = json.loads
+
+    def _dumps(obj) -> bytes:
+        return json.dumps(obj).encode('utf-8')
 
 ROOT = os.path.dirname(os.path.abspath(__file__))
 ROOT = os.path.abspath(os.path.join(ROOT, '..'))
 
 
-def run_cmd(cmd, cwd=None, timeout=600):
+# Constant replies, encoded once at import
+HEALTH_OK = _dumps({'ok': True})
+NOT_FOUND = _dumps({'error': 'not_found'})
+
+# One pipeline at a time: /run is rejected while a job holds JOB_LOCK (this process)
+# and the advisory flock on LOCK_PATH (other dev server processes)
+JOB_EXECUTOR = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+JOB_LOCK = threading.Lock()
+# Side work overlapped with a job's subprocess steps (JOB_EXECUTOR is busy running the job)
+IO_EXECUTOR = concurrent.futures.ThreadPoolExecutor(max_workers=2)
+LOCK_PATH = os.path.join(ROOT, 'data', '.run.lock')
+
+# Only the tail of each step's output is kept in last_run.json
+TAIL_CHARS = 4000
+# How long to wait for the pipe readers once a timed-out step has been killed
+READER_GRACE = 5
+
+
+def acquire_run_lock():
+    # Returns the locked fd (-1 without fcntl), or None when a pipeline is already running
+    if not JOB_LOCK.acquire(blocking=False):
+        return None
+    if fcntl is None:
+        return -1
     try:
-        res = subprocess.run(cmd, cwd=cwd or ROOT, capture_output=True, text=True, timeout=timeout)
-        return {
-            'cmd': ' '.join(cmd),
-            'code': res.returncode,
-            'stdout': res.stdout[-4000:],
-            'stderr': res.stderr[-4000:]
-        }
+        os.makedirs(os.path.dirname(LOCK_PATH), exist_ok=True)
+        fd = os.open(LOCK_PATH, os.O_CREAT | os.O_RDWR)
+    except OSError:
+        JOB_LOCK.release()
+        raise
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        os.close(fd)
+        JOB_LOCK.release()
+        return None
+    return fd
+
+
+def release_run_lock(fd):
+    try:
+        if fd >= 0:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+    finally:
+        JOB_LOCK.release()
+
+
+def _drain(pipe, tail):
+    try:
+        for chunk in iter(lambda: pipe.read(65536), b''):
+            tail.extend(chunk)
+    except (OSError, ValueError):  # pipe closed by run_cmd after a timeout
+        pass
+
+
+def _decode_tail(tail):
+    return bytes(tail).decode('utf-8', 'replace')
+
+
+def _kill_tree(p):
+    # The step runs in its own session: kill the whole group so grandchildren
+    # (Playwright driver, Chromium) release the pipes too
+    if hasattr(os, 'killpg'):
+        try:
+            os.killpg(p.pid, signal.SIGKILL)
+            return
+        except ProcessLookupError:
+            return
+        except OSError:
+            pass
+    p.kill()
+
+
+def run_cmd(cmd, cwd=None, timeout=600, env=None):
+    # Stream both pipes (raw bytes) into bounded ring buffers so chatty commands stay O(1)
+    # in memory; only the kept tail is ever decoded. Unbuffered pipes so they can be
+    # closed even while a reader is still blocked on them.
+    p = subprocess.Popen(
+        cmd, cwd=cwd or ROOT, stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=env,
+        bufsize=0, start_new_session=hasattr(os, 'killpg')
+    )
+    out_tail, err_tail = deque(maxlen=TAIL_CHARS), deque(maxlen=TAIL_CHARS)
+    readers = [
+        threading.Thread(target=_drain, args=(p.stdout, out_tail), daemon=True),
+        threading.Thread(target=_drain, args=(p.stderr, err_tail), daemon=True),
+    ]
+    for t in readers:
+        t.start()
+    try:
+        code = p.wait(timeout=timeout)
     except subprocess.TimeoutExpired:
+        _kill_tree(p)
+        p.wait()
         return {
             'cmd': ' '.join(cmd),
             'code': -1,
             'stdout': '',
             'stderr': 'timeout'
         }
+    finally:
+        # A process outside the group may still hold a pipe open: never wait for EOF forever
+        deadline = time.monotonic() + READER_GRACE
+        for t in readers:
+            t.join(timeout=max(0, deadline - time.monotonic()))
+        p.stdout.close()
+        p.stderr.close()
+    return {
+        'cmd': ' '.join(cmd),
+        'code': code,
+        'stdout': _decode_tail(out_tail),
+        'stderr': _decode_tail(err_tail)
+    }
+
+
+# Keep-alive connections to the local worker (wrangler dev), reused across jobs
+KV_HOST, KV_PORT, KV_CLEAR_PATH = '127.0.0.1', 8787, '/api/admin/cache/clear'
+_KV_POOL = urllib3.PoolManager(maxsize=4, retries=urllib3.Retry(total=1, allowed_methods=None))
+
+
+def clear_kv_cache():
+    # Best-effort: clear KV cache so UI sees fresh results immediately
+    step = {'cmd': 'POST ' + KV_CLEAR_PATH, 'code': 0, 'stdout': '', 'stderr': ''}
+    try:
+        resp = _KV_POOL.request('POST', f'http://{KV_HOST}:{KV_PORT}{KV_CLEAR_PATH}', timeout=urllib3.Timeout(total=5))
+        step.update(code=resp.status, stdout=resp.data.decode('utf-8', 'replace')[-TAIL_CHARS:])
+    except Exception as e:
+        step['stderr'] = str(e)
+    return step
+
+
+def read_run_outputs():
+    # (report, preview) for last_run.json, from the ETL's report.json and listings.json
+    report_path = os.path.join(ROOT, 'data', 'report.json')
+    report = None
+    if os.path.exists(report_path):
+        report = _loads(Path(report_path).read_bytes())
+    # Small preview from listings.json if present
+    preview = None
+    items_path = os.path.join(ROOT, 'data', 'listings.json')
+    if os.path.exists(items_path):
+        try:
+            if ijson is not None:
+                # Stream only the first items instead of parsing the whole file
+                with open(items_path, 'rb') as f:
+                    preview = list(itertools.islice(ijson.items(f, 'item', use_float=True), 10)) or None
+            else:
+                items = _loads(Path(items_path).read_bytes())
+                if isinstance(items, list):
+                    preview = items[:10]
+        except Exception:
+            preview = None
+    return report, preview
+
+
+def write_atomic(path, data):
+    # Readers never see a truncated file: write a sibling temp file then rename over path
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.' + os.path.basename(path) + '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            # Flush to disk before the rename so a crash can't leave an empty/partial file in place
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
 
 
 class Handler(BaseHTTPRequestHandler):
+    # Keep-alive lets the UI reuse one connection for its /last and /health polls;
+    # every response carries Content-Length, and idle connections drop after `timeout`
+    protocol_version = 'HTTP/1.1'
+    timeout = 30
+
     def _send(self, code, data):
-        body = json.dumps(data).encode('utf-8')
+        self._send_raw(code, _dumps(data))
+
+    def _send_raw(self, code, body):
         self.send_response(code)
         self.send_header('Content-Type', 'application/json')
         self.send_header('Content-Length', str(len(body)))
+        self.send_header('Connection', 'close' if self.close_connection else 'keep-alive')
         self.end_headers()
         self.wfile.write(body)
 
+    def _send_file(self, code, path):
+        # last_run.json is only ever replaced atomically with well-formed JSON, so it can be
+        # streamed as-is: socket.sendfile uses zero-copy os.sendfile where available
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            self.send_response(code)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(size))
+            self.send_header('Connection', 'close' if self.close_connection else 'keep-alive')
+            self.end_headers()
+            self.connection.sendfile(f, 0, size)
+
+    # Exact path (query string stripped) -> handler method name
+    _GET_ROUTES = {'/health': '_health', '/run': '_run', '/last': '_last'}
+    _POST_ROUTES = {'/run': '_run'}
+
     def do_GET(self):
-        if self.path.startswith('/health'):
-            return self._send(200, {'ok': True})
-        if self.path.startswith('/run'):
-            return self._run()
-        if self.path.startswith('/last'):
-            last_path = os.path.join(ROOT, 'data', 'last_run.json')
-            if os.path.exists(last_path):
-                try:
-                    with open(last_path, 'r') as f:
-                        data = json.load(f)
-                    return self._send(200, data)
-                except Exception as e:
-                    return self._send(500, {'ok': False, 'error': str(e)})
-            return self._send(404, {'ok': False, 'error': 'no_last_run'})
-        self._send(404, {'error': 'not_found'})
+        handler = self._GET_ROUTES.get(self.path.split('?', 1)[0])
+        if handler:
+            return getattr(self, handler)()
+        self._send_raw(404, NOT_FOUND)
 
     def do_POST(self):
-        if self.path.startswith('/run'):
-            return self._run()
-        self._send(404, {'error': 'not_found'})
+        handler = self._POST_ROUTES.get(self.path.split('?', 1)[0])
+        if handler:
+            return getattr(self, handler)()
+        # Unread request body would be parsed as the next request on this connection
+        self.close_connection = True
+        self._send_raw(404, NOT_FOUND)
+
+    def _health(self):
+        self._send_raw(200, HEALTH_OK)
+
+    def _last(self):
+        last_path = os.path.join(ROOT, 'data', 'last_run.json')
+        if os.path.exists(last_path):
+            try:
+                return self._send_file(200, last_path)
+            except Exception as e:
+                return self._send(500, {'ok': False, 'error': str(e)})
+        return self._send(404, {'ok': False, 'error': 'no_last_run'})
 
     def _run(self):
-        # Get request parameters for XHR scraper
+        # Read and parse the request body once: scraper params and the sources override
+        # both come from it (a second rfile.read would block on a keep-alive connection)
         query_params = {}
-        if hasattr(self, 'headers') and 'content-length' in self.headers:
-            try:
-                content_length = int(self.headers['content-length'])
-                if content_length > 0:
-                    post_data = self.rfile.read(content_length).decode('utf-8')
-                    query_params = json.loads(post_data)
-            except:
-                pass
+        try:
+            content_length = int(self.headers.get('Content-Length') or 0)
+            raw = self.rfile.read(content_length) if content_length > 0 else b''
+            if raw:
+                query_params = _loads(raw)
+        except Exception:
+            pass
+        if not isinstance(query_params, dict):
+            query_params = {}
                 
         # Extract CLI args for scrapers
         where = query_params.get('where', 'montreal/lachine')
@@ -97,13 +309,9 @@ class Handler(BaseHTTPRequestHandler):
                 if query_params.get('debug', False):
                     clean_cmd.append('--debug')
                     
-                xhr_success = False
-                try:
-                    res1 = subprocess.run(clean_cmd, cwd=ROOT, capture_output=True, text=True, timeout=600)
-                    steps.append({'cmd': ' '.join(clean_cmd), 'code': res1.returncode, 'stdout': res1.stdout[-4000:], 'stderr': res1.stderr[-4000:]})
-                    xhr_success = (res1.returncode == 0)
-                except subprocess.TimeoutExpired:
-                    steps.append({'cmd': ' '.join(clean_cmd), 'code': -1, 'stdout': '', 'stderr': 'timeout'})
+                res1 = run_cmd(clean_cmd)
+                steps.append(res1)
+                xhr_success = (res1['code'] == 0)
                     
                 # Map realtor data with ETL if successful
                 if xhr_success:
@@ -111,55 +319,36 @@ class Handler(BaseHTTPRequestHandler):
             else:
                 # Use generic Scrapy spider
                 env['MAKE_CRAWL_EXTRA'] = "-s ROBOTSTXT_OBEY=false"
-                try:
-                    res1 = subprocess.run(['make', 'crawl'], cwd=ROOT, capture_output=True, text=True, timeout=600, env=env)
-                    steps.append({'cmd': 'make crawl', 'code': res1.returncode, 'stdout': res1.stdout[-4000:], 'stderr': res1.stderr[-4000:]})
-                except subprocess.TimeoutExpired:
-                    steps.append({'cmd': 'make crawl', 'code': -1, 'stdout': '', 'stderr': 'timeout'})
+                steps.append(run_cmd(['make', 'crawl'], env=env))
                 steps.append(run_cmd(['make', 'etl']))
+            # ETL outputs are final from here: read them while the D1 upload runs
+            outputs = IO_EXECUTOR.submit(read_run_outputs)
             upload_sql = os.path.join(ROOT, 'data', 'upload.sql')
             if os.path.exists(upload_sql):
-                # Clear existing listings to avoid mixing old local file:// rows with fresh live data
-                steps.append(run_cmd(['npx', 'wrangler', 'd1', 'execute', 'estate-db', '--local', '--command', 'DELETE FROM listings;'], cwd=os.path.join(ROOT, 'workers')))
-                steps.append(run_cmd(['npx', 'wrangler', 'd1', 'execute', 'estate-db', '--local', '--file', '../data/upload.sql'], cwd=os.path.join(ROOT, 'workers')))
+                # Clear existing listings to avoid mixing old local file:// rows with fresh live data;
+                # prepended to the upload so a single wrangler (Node) process runs both
+                combined_sql = Path(ROOT) / 'data' / 'upload_combined.sql'
+                combined_sql.write_bytes(b'DELETE FROM listings;\n' + Path(upload_sql).read_bytes())
+                steps.append(run_cmd(['npx', 'wrangler', 'd1', 'execute', 'estate-db', '--local', '--file', '../data/upload_combined.sql'], cwd=os.path.join(ROOT, 'workers')))
                 # Best-effort: clear KV cache so UI sees fresh results immediately
-                try:
-                    import urllib.request
-                    req = urllib.request.Request('http://127.0.0.1:8787/api/admin/cache/clear', method='POST')
-                    with urllib.request.urlopen(req, timeout=5) as resp:
-                        steps.append({'cmd': 'POST /api/admin/cache/clear', 'code': resp.status, 'stdout': resp.read().decode('utf-8')[-4000:], 'stderr': ''})
-                except Exception as e:
-                    steps.append({'cmd': 'POST /api/admin/cache/clear', 'code': 0, 'stdout': '', 'stderr': str(e)})
+                steps.append(clear_kv_cache())
             # Write a last result file for the UI to read
             last_path = os.path.join(ROOT, 'data', 'last_run.json')
             try:
-                report_path = os.path.join(ROOT, 'data', 'report.json')
-                report = None
-                if os.path.exists(report_path):
-                    with open(report_path, 'r') as f:
-                        report = json.load(f)
-                # Small preview from listings.json if present
-                preview = None
-                items_path = os.path.join(ROOT, 'data', 'listings.json')
-                if os.path.exists(items_path):
-                    try:
-                        with open(items_path, 'r') as f:
-                            items = json.load(f)
-                        if isinstance(items, list):
-                            preview = items[:10]
-                    except Exception:
-                        preview = None
+                report, preview = outputs.result()
                 ok = all(s['code'] == 0 for s in steps[:2])
-                with open(last_path, 'w') as f:
-                    json.dump({'ok': ok, 'steps': steps, 'report': report, 'preview': preview}, f)
+                write_atomic(last_path, _dumps({'ok': ok, 'steps': steps, 'report': report, 'preview': preview}))
             except Exception as e:
-                with open(last_path, 'w') as f:
-                    json.dump({'ok': False, 'error': str(e), 'steps': steps}, f)
+                write_atomic(last_path, _dumps({'ok': False, 'error': str(e), 'steps': steps}))
+
+        # Take the lock before touching data/tmp so a rejected /run can't clobber the running job's sources
+        lock_fd = acquire_run_lock()
+        if lock_fd is None:
+            return self._send(409, {'ok': False, 'error': 'already_running'})
 
         # Parse optional sources override from query string (?sources=/path/to.yml)
         src_override = None
         try:
-            from urllib.parse import urlparse, parse_qs
             qs = parse_qs(urlparse(self.path).query)
             src_override = qs.get('sources', [None])[0]
         except Exception:
@@ -168,21 +357,27 @@ class Handler(BaseHTTPRequestHandler):
         # If POST body contains sources YAML/content, write to a temp file and use it
         if self.command == 'POST':
             try:
-                length = int(self.headers.get('Content-Length') or 0)
-                body = self.rfile.read(length) if length > 0 else b''
-                if body:
-                    payload = json.loads(body.decode('utf-8'))
-                    content = payload.get('sources_yaml') or payload.get('sources_content') or payload.get('sources')
-                    if isinstance(content, str) and content.strip():
-                        from pathlib import Path
-                        tmp_dir = Path(ROOT) / 'data' / 'tmp'
-                        tmp_dir.mkdir(parents=True, exist_ok=True)
-                        tmp_path = tmp_dir / 'sources_generated.yml'
-                        tmp_path.write_text(content, encoding='utf-8')
-                        src_override = str(tmp_path)
+                content = query_params.get('sources_yaml') or query_params.get('sources_content') or query_params.get('sources')
+                if isinstance(content, str) and content.strip():
+                    tmp_dir = Path(ROOT) / 'data' / 'tmp'
+                    tmp_dir.mkdir(parents=True, exist_ok=True)
+                    tmp_path = tmp_dir / 'sources_generated.yml'
+                    write_atomic(str(tmp_path), content.encode('utf-8'))
+                    src_override = str(tmp_path)
             except Exception:
                 pass
-        threading.Thread(target=job, args=(src_override,), daemon=True).start()
+
+        def locked_job(sources_override):
+            try:
+                job(sources_override)
+            finally:
+                release_run_lock(lock_fd)
+
+        try:
+            JOB_EXECUTOR.submit(locked_job, src_override)
+        except Exception:
+            release_run_lock(lock_fd)
+            raise
         self._send(202, {'ok': True, 'status': 'started', 'sources': src_override or 'default'})
 
 
@@ -190,7 +385,7 @@ def main():
     host = '127.0.0.1'
     port = int(os.environ.get('SCRAPER_SERVER_PORT', '8000'))
     try:
-        httpd = HTTPServer((host, port), Handler)
+        httpd = ThreadingHTTPServer((host, port), Handler)
     except OSError as e:
         # Port already in use: check if it's our server; if yes, exit quietly, else explain
         if getattr(e, 'errno', None) in (48, 98):
@@ -3,77 +3,38 @@
 Dashboard de visualisation des résultats de scraping
 Génère des rapports HTML avec cartes, graphiques et métriques
 """
+import gzip
+import hashlib
+import heapq
 import json
+import math
 import os
+import string
 from datetime import datetime, timezone
 from pathlib import Path
 from typing import Dict, List, Any
 import argparse
 
-def load_preview_files() -> Dict[str, Any]:
-    """Charge tous les fichiers preview_*.json"""
-    logs_dir = Path(__file__).resolve().parents[1] / "logs"
-    previews = {}
-    
-    for file in logs_dir.glob("preview_*.json"):
-        source = file.stem.replace("preview_", "")
-        try:
-            with open(file, 'r', encoding='utf-8') as f:
-                previews[source] = json.load(f)
-        except Exception as e:
-            print(f"Erreur lecture {file}: {e}")
-    
-    return previews
+import numpy as np
 
-def generate_map_data(previews: Dict[str, Any]) -> str:
-    """Génère les données JavaScript pour la carte"""
-    markers = []
-    
-    for source, data in previews.items():
-        if not data.get('blocked', True) and data.get('preview'):
-            for listing in data['preview']:
-                if listing.get('address') and listing.get('price'):
-                    # Coordonnées approximatives pour Montréal/Lachine
-                    lat = 45.445 + (hash(listing['address']) % 100) * 0.001
-                    lon = -73.675 + (hash(listing['address']) % 100) * 0.001
-                    
-                    markers.append({
-                        'lat': lat,
-                        'lon': lon,
-                        'price': listing['price'],
-                        'address': listing['address'],
-                        'source': source,
-                        'url': listing.get('url', '#')
-                    })
-    
-    return json.dumps(markers)
+# Les tableaux NumPy sont sérialisés nativement (orjson) ou via tolist() (json)
+try:
+    import orjson
+    _loads = orjson.loads
 
-def generate_html_dashboard(previews: Dict[str, Any]) -> str:
-    """Génère le dashboard HTML complet"""
-    
-    # Stats globales
-    total_listings = sum(p.get('count', 0) for p in previews.values())
-    total_sources = len(previews)
-    blocked_sources = sum(1 for p in previews.values() if p.get('blocked', True))
-    successful_sources = total_sources - blocked_sources
-    
-    # Prix moyen
-    all_prices = []
-    for data in previews.values():
-        if not data.get('blocked') and data.get('preview'):
-            for listing in data['preview']:
-                if isinstance(listing.get('price'), (int, float)):
-                    all_prices.append(listing['price'])
-    
-    avg_price = sum(all_prices) / len(all_prices) if all_prices else 0
-    min_price = min(all_prices) if all_prices else 0
-    max_price = max(all_prices) if all_prices else 0
-    
-    # Données pour la carte
-    map_data = generate_map_data(previews)
-    
-    # Génération du HTML
-    html = f"""
+    def _dumps(obj) -> str:
+        return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY).decode('utf-8')
+except ImportError:
+    _loads = json.loads
+
+    def _dumps(obj) -> str:
+        return json.dumps(obj, default=lambda o: o.tolist())
+
+# Cache des previews parsées: chemin -> (st_mtime_ns, st_size, données)
+_PREVIEW_CACHE: Dict[str, tuple] = {}
+
+# Gabarit HTML du dashboard, compilé une fois à l'import ($$ = "$" littéral)
+_TEMPLATE = string.Template("""
 <!DOCTYPE html>
 <html lang="fr">
 <head>
@@ -84,93 +45,93 @@ def generate_html_dashboard(previews: Dict[str, Any]) -> str:
     <script src="https://unpkg.com/leaflet@1.9.4/dist/leaflet.js"></script>
     <script src="https://cdn.jsdelivr.net/npm/chart.js"></script>
     <style>
-        * {{ margin: 0; padding: 0; box-sizing: border-box; }}
-        body {{ 
+        * { margin: 0; padding: 0; box-sizing: border-box; }
+        body { 
             font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', system-ui; 
             background: #f8fafc;
             color: #1e293b;
-        }}
-        .header {{ 
+        }
+        .header { 
             background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
             color: white; 
             padding: 2rem;
             text-align: center;
-        }}
-        .header h1 {{ font-size: 2.5rem; margin-bottom: 0.5rem; }}
-        .header p {{ opacity: 0.9; }}
-        .container {{ max-width: 1200px; margin: 0 auto; padding: 2rem; }}
-        .stats-grid {{ 
+        }
+        .header h1 { font-size: 2.5rem; margin-bottom: 0.5rem; }
+        .header p { opacity: 0.9; }
+        .container { max-width: 1200px; margin: 0 auto; padding: 2rem; }
+        .stats-grid { 
             display: grid; 
             grid-template-columns: repeat(auto-fit, minmax(250px, 1fr)); 
             gap: 1rem; 
             margin-bottom: 2rem;
-        }}
-        .stat-card {{ 
+        }
+        .stat-card { 
             background: white; 
             padding: 1.5rem; 
             border-radius: 12px; 
             box-shadow: 0 4px 6px -1px rgba(0,0,0,0.1);
             text-align: center;
-        }}
-        .stat-card h3 {{ color: #64748b; font-size: 0.9rem; text-transform: uppercase; }}
-        .stat-card .value {{ font-size: 2rem; font-weight: bold; margin: 0.5rem 0; }}
-        .stat-card.success .value {{ color: #10b981; }}
-        .stat-card.warning .value {{ color: #f59e0b; }}
-        .stat-card.danger .value {{ color: #ef4444; }}
-        .stat-card.info .value {{ color: #3b82f6; }}
+        }
+        .stat-card h3 { color: #64748b; font-size: 0.9rem; text-transform: uppercase; }
+        .stat-card .value { font-size: 2rem; font-weight: bold; margin: 0.5rem 0; }
+        .stat-card.success .value { color: #10b981; }
+        .stat-card.warning .value { color: #f59e0b; }
+        .stat-card.danger .value { color: #ef4444; }
+        .stat-card.info .value { color: #3b82f6; }
         
-        .content-grid {{ display: grid; grid-template-columns: 1fr 1fr; gap: 2rem; }}
-        .panel {{ background: white; border-radius: 12px; padding: 1.5rem; box-shadow: 0 4px 6px -1px rgba(0,0,0,0.1); }}
-        .panel h2 {{ margin-bottom: 1rem; color: #1e293b; }}
+        .content-grid { display: grid; grid-template-columns: 1fr 1fr; gap: 2rem; }
+        .panel { background: white; border-radius: 12px; padding: 1.5rem; box-shadow: 0 4px 6px -1px rgba(0,0,0,0.1); }
+        .panel h2 { margin-bottom: 1rem; color: #1e293b; }
         
-        #map {{ height: 400px; border-radius: 8px; }}
+        #map { height: 400px; border-radius: 8px; }
         
-        .source-list {{ max-height: 400px; overflow-y: auto; }}
-        .source-item {{ 
+        .source-list { max-height: 400px; overflow-y: auto; }
+        .source-item { 
             padding: 1rem; 
             border-bottom: 1px solid #e2e8f0; 
             display: flex; 
             justify-content: between;
             align-items: center;
-        }}
-        .source-status {{ 
+        }
+        .source-status { 
             padding: 0.25rem 0.75rem; 
             border-radius: 20px; 
             font-size: 0.8rem; 
             font-weight: 600;
-        }}
-        .status-success {{ background: #dcfce7; color: #166534; }}
-        .status-blocked {{ background: #fee2e2; color: #991b1b; }}
-        .status-error {{ background: #fef3c7; color: #92400e; }}
+        }
+        .status-success { background: #dcfce7; color: #166534; }
+        .status-blocked { background: #fee2e2; color: #991b1b; }
+        .status-error { background: #fef3c7; color: #92400e; }
         
-        .listing-preview {{ 
+        .listing-preview { 
             max-height: 300px; 
             overflow-y: auto; 
             background: #f1f5f9; 
             padding: 1rem; 
             border-radius: 8px; 
-        }}
-        .listing-item {{ 
+        }
+        .listing-item { 
             background: white; 
             padding: 0.75rem; 
             margin-bottom: 0.5rem; 
             border-radius: 6px; 
             font-size: 0.9rem;
-        }}
-        .listing-price {{ font-weight: bold; color: #059669; }}
-        .listing-address {{ color: #64748b; margin-top: 0.25rem; }}
+        }
+        .listing-price { font-weight: bold; color: #059669; }
+        .listing-address { color: #64748b; margin-top: 0.25rem; }
         
-        @media (max-width: 768px) {{
-            .content-grid {{ grid-template-columns: 1fr; }}
-            .stats-grid {{ grid-template-columns: repeat(2, 1fr); }}
-        }}
+        @media (max-width: 768px) {
+            .content-grid { grid-template-columns: 1fr; }
+            .stats-grid { grid-template-columns: repeat(2, 1fr); }
+        }
     </style>
 </head>
 <body>
     <div class="header">
         <h1>🏠 ScrappingBot Dashboard</h1>
         <p>Visualisation en temps réel des données immobilières scrapées</p>
-        <p><small>Dernière mise à jour: {datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S UTC')}</small></p>
+        <p><small>Dernière mise à jour: $updated_at</small></p>
     </div>
     
     <div class="container">
@@ -178,19 +139,19 @@ def generate_html_dashboard(previews: Dict[str, Any]) -> str:
         <div class="stats-grid">
             <div class="stat-card success">
                 <h3>Total Listings</h3>
-                <div class="value">{total_listings:,}</div>
+                <div class="value">$total_listings</div>
             </div>
             <div class="stat-card info">
                 <h3>Sources Actives</h3>
-                <div class="value">{successful_sources}/{total_sources}</div>
+                <div class="value">$successful_sources/$total_sources</div>
             </div>
             <div class="stat-card warning">
                 <h3>Prix Moyen</h3>
-                <div class="value">{avg_price:,.0f}$</div>
+                <div class="value">$avg_price$$</div>
             </div>
             <div class="stat-card danger">
                 <h3>Sources Bloquées</h3>
-                <div class="value">{blocked_sources}</div>
+                <div class="value">$blocked_sources</div>
             </div>
         </div>
         
@@ -205,36 +166,7 @@ def generate_html_dashboard(previews: Dict[str, Any]) -> str:
             <div class="panel">
                 <h2>📊 État des Sources</h2>
                 <div class="source-list">
-"""
-    
-    # Ajout des sources
-    for source, data in previews.items():
-        strategy = data.get('strategy', 'unknown')
-        count = data.get('count', 0)
-        blocked = data.get('blocked', True)
-        elapsed = data.get('elapsed_sec', 0)
-        
-        if blocked:
-            status_class = "status-blocked"
-            status_text = "BLOQUÉ"
-        elif count > 0:
-            status_class = "status-success"
-            status_text = f"{count} items"
-        else:
-            status_class = "status-error" 
-            status_text = "VIDE"
-            
-        html += f"""
-                    <div class="source-item">
-                        <div>
-                            <strong>{source}</strong><br>
-                            <small>Stratégie: {strategy} • {elapsed:.1f}s</small>
-                        </div>
-                        <span class="source-status {status_class}">{status_text}</span>
-                    </div>
-        """
-    
-    html += """
+$sources_html
                 </div>
             </div>
         </div>
@@ -243,30 +175,7 @@ def generate_html_dashboard(previews: Dict[str, Any]) -> str:
         <div class="panel" style="margin-top: 2rem;">
             <h2>🏘️ Aperçu des Listings</h2>
             <div class="listing-preview">
-"""
-    
-    # Ajout des listings
-    all_listings = []
-    for source, data in previews.items():
-        if not data.get('blocked') and data.get('preview'):
-            for listing in data['preview'][:5]:  # Max 5 par source
-                listing['_source'] = source
-                all_listings.append(listing)
-    
-    # Tri par prix décroissant
-    all_listings.sort(key=lambda x: x.get('price', 0), reverse=True)
-    
-    for listing in all_listings[:20]:  # Max 20 total
-        price_str = f"{listing.get('price', 0):,}$" if listing.get('price') else "Prix non spécifié"
-        html += f"""
-                <div class="listing-item">
-                    <div class="listing-price">{price_str}</div>
-                    <div class="listing-address">{listing.get('address', 'Adresse non spécifiée')}</div>
-                    <small>Source: {listing.get('_source', 'unknown')} • Chambres: {listing.get('bedrooms', '?')} • Bains: {listing.get('bathrooms', '?')}</small>
-                </div>
-        """
-    
-    html += f"""
+$listings_html
             </div>
         </div>
         
@@ -276,15 +185,15 @@ def generate_html_dashboard(previews: Dict[str, Any]) -> str:
             <div style="display: grid; grid-template-columns: repeat(auto-fit, minmax(200px, 1fr)); gap: 1rem;">
                 <div style="text-align: center;">
                     <h4>Prix Min</h4>
-                    <p style="font-size: 1.5rem; color: #059669;">{min_price:,.0f}$</p>
+                    <p style="font-size: 1.5rem; color: #059669;">$min_price$$</p>
                 </div>
                 <div style="text-align: center;">
                     <h4>Prix Max</h4>
-                    <p style="font-size: 1.5rem; color: #dc2626;">{max_price:,.0f}$</p>
+                    <p style="font-size: 1.5rem; color: #dc2626;">$max_price$$</p>
                 </div>
                 <div style="text-align: center;">
                     <h4>Total Listings</h4>
-                    <p style="font-size: 1.5rem; color: #2563eb;">{len(all_listings)}</p>
+                    <p style="font-size: 1.5rem; color: #2563eb;">$preview_total</p>
                 </div>
             </div>
         </div>
@@ -293,36 +202,175 @@ def generate_html_dashboard(previews: Dict[str, Any]) -> str:
     <script>
         // Initialisation de la carte
         const map = L.map('map').setView([45.445, -73.675], 11);
-        L.tileLayer('https://{{s}}.tile.openstreetmap.org/{{z}}/{{x}}/{{y}}.png', {{
+        L.tileLayer('https://{s}.tile.openstreetmap.org/{z}/{x}/{y}.png', {
             attribution: '© OpenStreetMap contributors'
-        }}).addTo(map);
+        }).addTo(map);
         
         // Données des marqueurs
-        const markers = {map_data};
+        const mapData = $map_data;
         
-        // Ajout des marqueurs sur la carte
-        markers.forEach(marker => {{
+        // Ajout des marqueurs sur la carte (coordonnées et métadonnées en parallèle)
+        mapData.coords.forEach(([lat, lon], i) => {
+            const [price, address, source] = mapData.meta[i];
             const popup = `
-                <b>${{marker.price.toLocaleString()}}$</b><br>
-                ${{marker.address}}<br>
-                <small>Source: ${{marker.source}}</small>
+                <b>$${price.toLocaleString()}$$</b><br>
+                $${address}<br>
+                <small>Source: $${source}</small>
             `;
             
-            L.marker([marker.lat, marker.lon])
+            L.marker([lat, lon])
                 .addTo(map)
                 .bindPopup(popup);
-        }});
+        });
         
         // Auto-refresh toutes les 30 secondes
-        setInterval(() => {{
+        setInterval(() => {
             location.reload();
-        }}, 30000);
+        }, 30000);
     </script>
 </body>
 </html>
-    """
+    """)
+
+def load_preview_files() -> Dict[str, Any]:
+    """Charge tous les fichiers preview_*.json"""
+    logs_dir = Path(__file__).resolve().parents[1] / "logs"
+    previews = {}
+    
+    for file in logs_dir.glob("preview_*.json"):
+        source = file.stem.replace("preview_", "")
+        try:
+            # Ne re-parse que les fichiers modifiés depuis le dernier chargement
+            st = file.stat()
+            cached = _PREVIEW_CACHE.get(str(file))
+            if cached and cached[:2] == (st.st_mtime_ns, st.st_size):
+                previews[source] = cached[2]
+                continue
+            data = _loads(file.read_bytes())
+            _PREVIEW_CACHE[str(file)] = (st.st_mtime_ns, st.st_size, data)
+            previews[source] = data
+        except Exception as e:
+            print(f"Erreur lecture {file}: {e}")
+    
+    return previews
+
+def _markers_json(addresses: List[str], prices: List[Any], sources: List[str], urls: List[str]) -> str:
+    """Sérialise les marqueurs de la carte: {"coords": [[lat, lon], ...], "meta": [[prix, adresse, source, url], ...]}"""
+    if not addresses:
+        return '{"coords": [], "meta": []}'
+    
+    # Coordonnées approximatives pour Montréal/Lachine: décalage stable dérivé de
+    # l'adresse (blake2b, contrairement à hash() qui change à chaque exécution),
+    # calculé en un seul passage vectorisé
+    digests = b"".join(hashlib.blake2b(a.encode('utf-8'), digest_size=8).digest() for a in addresses)
+    offsets = (np.frombuffer(digests, dtype=np.uint64) % 100) * 0.001
+    # Coordonnées dans un seul bloc contigu (n x 2), le reste en colonnes parallèles
+    coords = np.column_stack((45.445 + offsets, -73.675 + offsets))
+    meta = list(zip(prices, addresses, sources, urls))
+    return _dumps({'coords': coords, 'meta': meta})
+
+def generate_html_dashboard(previews: Dict[str, Any]) -> str:
+    """Génère le dashboard HTML complet"""
+    
+    # Stats globales, prix, marqueurs et aperçu calculés en un seul passage
+    total_sources = len(previews)
+    total_listings = 0
+    blocked_sources = 0
+    price_sum = 0.0
+    price_count = 0
+    min_price = math.inf
+    max_price = -math.inf
+    addresses, prices, sources, urls = [], [], [], []
+    all_listings = []
+    
+    for source, data in previews.items():
+        total_listings += data.get('count', 0)
+        if data.get('blocked', True):
+            blocked_sources += 1
+        if data.get('blocked') or not data.get('preview'):
+            continue
+        # La carte exige un statut explicitement non bloqué
+        on_map = 'blocked' in data
+        for i, listing in enumerate(data['preview']):
+            price = listing.get('price')
+            if isinstance(price, (int, float)):
+                price_sum += price
+                price_count += 1
+                min_price = min(min_price, price)
+                max_price = max(max_price, price)
+            if on_map and listing.get('address') and price:
+                addresses.append(listing['address'])
+                prices.append(price)
+                sources.append(source)
+                urls.append(listing.get('url', '#'))
+            if i < 5:  # Max 5 par source
+                listing['_source'] = source
+                all_listings.append(listing)
+    
+    successful_sources = total_sources - blocked_sources
+    avg_price = price_sum / price_count if price_count else 0
+    if not price_count:
+        min_price = max_price = 0
+    
+    # Données pour la carte
+    map_data = _markers_json(addresses, prices, sources, urls)
+    
+    # Fragments répétés, joints une seule fois puis injectés dans le gabarit précompilé
+    # Ajout des sources
+    sources_html = []
+    for source, data in previews.items():
+        strategy = data.get('strategy', 'unknown')
+        count = data.get('count', 0)
+        blocked = data.get('blocked', True)
+        elapsed = data.get('elapsed_sec', 0)
+        
+        if blocked:
+            status_class = "status-blocked"
+            status_text = "BLOQUÉ"
+        elif count > 0:
+            status_class = "status-success"
+            status_text = f"{count} items"
+        else:
+            status_class = "status-error" 
+            status_text = "VIDE"
+            
+        sources_html.append(f"""
+                    <div class="source-item">
+                        <div>
+                            <strong>{source}</strong><br>
+                            <small>Stratégie: {strategy} • {elapsed:.1f}s</small>
+                        </div>
+                        <span class="source-status {status_class}">{status_text}</span>
+                    </div>
+        """)
+    
+    # Ajout des listings: les 20 plus chers, par prix décroissant (sans trier toute la liste)
+    top_listings = heapq.nlargest(20, all_listings, key=lambda x: x.get('price') or 0)
+    listings_html = []
+    for listing in top_listings:
+        price_str = f"{listing.get('price', 0):,}$" if listing.get('price') else "Prix non spécifié"
+        listings_html.append(f"""
+                <div class="listing-item">
+                    <div class="listing-price">{price_str}</div>
+                    <div class="listing-address">{listing.get('address', 'Adresse non spécifiée')}</div>
+                    <small>Source: {listing.get('_source', 'unknown')} • Chambres: {listing.get('bedrooms', '?')} • Bains: {listing.get('bathrooms', '?')}</small>
+                </div>
+        """)
     
-    return html
+    return _TEMPLATE.substitute(
+        updated_at=datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S UTC'),
+        total_listings=f"{total_listings:,}",
+        successful_sources=successful_sources,
+        total_sources=total_sources,
+        avg_price=f"{avg_price:,.0f}",
+        blocked_sources=blocked_sources,
+        sources_html="".join(sources_html),
+        listings_html="".join(listings_html),
+        min_price=f"{min_price:,.0f}",
+        max_price=f"{max_price:,.0f}",
+        preview_total=len(all_listings),
+        map_data=map_data,
+    )
 
 def main():
     parser = argparse.ArgumentParser(description="Générateur de dashboard de scraping")
@@ -342,9 +390,14 @@ def main():
     # Écriture du fichier
     output_path = Path(__file__).resolve().parents[1] / args.output
     output_path.parent.mkdir(exist_ok=True)
-    output_path.write_text(html, encoding='utf-8')
+    html_bytes = html.encode('utf-8')
+    output_path.write_bytes(html_bytes)
+    # Copie compressée pour le service HTTP / les partages réseau
+    gz_path = output_path.with_name(output_path.name + '.gz')
+    with gzip.open(gz_path, 'wb', compresslevel=6) as f:
+        f.write(html_bytes)
     
-    print(f"✅ Dashboard généré: {output_path}")
+    print(f"✅ Dashboard généré: {output_path} (+ {gz_path.name})")
     print(f"🌐 Ouvrir: file://{output_path}")
     
     return 0
@@ -4,7 +4,15 @@ Utilitaire de maintenance et nettoyage pour le scraper
 Nettoyage des logs, archivage, optimisation
 """
 import os
+import sys
+import functools
+import heapq
+import itertools
+import operator
+import time
+from concurrent.futures import ProcessPoolExecutor
 import shutil
+import subprocess
 import gzip
 from pathlib import Path
 from datetime import datetime, timedelta
@@ -12,6 +20,56 @@ import json
 import argparse
 from typing import Dict, List, Any
 
+try:
+    import orjson
+
+    _loads = orjson.loads
+
+    def _dumps_pretty(obj) -> bytes:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+except ImportError:  # stdlib fallback
+    _loads = json.loads
+
+    def _dumps_pretty(obj) -> bytes:
+        return json.dumps(obj, indent=2, ensure_ascii=False).encode('utf-8')
+
+try:
+    import ijson
+except ImportError:  # validation des previews par parse complet
+    ijson = None
+
+JSON_ERRORS = (json.JSONDecodeError, ijson.JSONError) if ijson else (json.JSONDecodeError,)
+
+try:
+    import deflate  # binding libdeflate (DEFLATE SIMD en C)
+except ImportError:
+    deflate = None
+
+try:
+    import zstandard as zstd
+except ImportError:  # --codec zstd indisponible
+    zstd = None
+
+# Niveau 6 = défaut de la commande gzip (le niveau 9 de gzip.open coûte cher pour peu de gain)
+GZIP_LEVEL = 6
+# Au-delà de cette taille, pigz (DEFLATE parallèle) si disponible
+PIGZ_MIN_BYTES = 8 * 1024 * 1024
+PIGZ = shutil.which("pigz")
+COPY_CHUNK = 1 << 20
+# zstd niveau 3: ratio proche de gzip sur du JSON, compression plusieurs fois plus rapide
+ZSTD_LEVEL = 3
+CODECS = {'gzip': '.json.gz', 'zstd': '.json.zst'}
+
+# Types de fichiers suivis dans logs/: (préfixe, extension) -> clé du rapport
+BUCKETS = {
+    ('preview', '.json'): 'preview_X.json',
+    ('debug', '.html'): 'debug_X.html',
+    ('debug', '.mhtml'): 'debug_X.mhtml',
+    ('debug', '.png'): 'debug_X.png',
+    ('debug', '.jpg'): 'debug_X.jpg',
+}
+DEBUG_BUCKETS = ('debug_X.html', 'debug_X.mhtml', 'debug_X.png', 'debug_X.jpg')
+
 class Colors:
     GREEN = '\033[92m'
     YELLOW = '\033[93m'
@@ -21,10 +79,16 @@ class Colors:
     BOLD = '\033[1m'
     RESET = '\033[0m'
 
+# Codes ANSI seulement vers un terminal (pas dans les fichiers de log ni journald)
+_COLOR = sys.stdout.isatty()
+
 def log(message: str, color: str = Colors.CYAN):
     """Log avec couleur et timestamp"""
-    timestamp = datetime.now().strftime("%H:%M:%S")
-    print(f"[{timestamp}] {color}{message}{Colors.RESET}")
+    timestamp = time.strftime("%H:%M:%S")
+    if _COLOR:
+        print(f"[{timestamp}] {color}{message}{Colors.RESET}")
+    else:
+        print(f"[{timestamp}] {message}")
 
 def get_file_size_mb(file_path: Path) -> float:
     """Retourne la taille du fichier en MB"""
@@ -33,48 +97,108 @@ def get_file_size_mb(file_path: Path) -> float:
     except:
         return 0
 
+def file_bucket(name: str):
+    """Classe un nom de fichier dans BUCKETS sans relancer de glob (None si hors catégorie)"""
+    prefix, sep, _ = name.partition('_')
+    if not sep:
+        return None
+    return BUCKETS.get((prefix, os.path.splitext(name)[1]))
+
+def _walk_size(root: str) -> tuple:
+    """Parcours os.scandir itératif: (taille totale en octets, DirEntry des fichiers)"""
+    total = 0
+    entries = []
+    stack = [root]
+    while stack:
+        with os.scandir(stack.pop()) as it:
+            for e in it:
+                if e.is_dir(follow_symlinks=False):
+                    stack.append(e.path)
+                elif e.is_file(follow_symlinks=False):
+                    total += e.stat().st_size
+                    entries.append(e)
+    return total, entries
+
 def get_directory_size_mb(dir_path: Path) -> float:
     """Retourne la taille totale du dossier en MB"""
     try:
-        return sum(f.stat().st_size for f in dir_path.rglob('*') if f.is_file()) / (1024 * 1024)
+        return _walk_size(str(dir_path))[0] / (1024 * 1024)
     except:
         return 0
 
-def archive_old_files(logs_dir: Path, days_old: int = 7) -> Dict[str, int]:
-    """Archive les fichiers anciens"""
+def gzip_file(src: Path, dst: Path, size: int) -> None:
+    """Compresse src vers dst (gzip) avec le backend le plus rapide disponible"""
+    if PIGZ and size >= PIGZ_MIN_BYTES:
+        with open(dst, 'wb') as f_out:
+            subprocess.run([PIGZ, f"-{GZIP_LEVEL}", "-c", str(src)], stdout=f_out, check=True)
+    elif deflate is not None:
+        dst.write_bytes(deflate.gzip_compress(src.read_bytes(), GZIP_LEVEL))
+    else:
+        # Blocs de 1 MiB: moins d'allers-retours Python dans l'encodeur gzip
+        with open(src, 'rb', buffering=COPY_CHUNK) as f_in, \
+                gzip.open(dst, 'wb', compresslevel=GZIP_LEVEL) as f_out:
+            shutil.copyfileobj(f_in, f_out, length=COPY_CHUNK)
+
+def zstd_file(src: Path, dst: Path) -> None:
+    """Compresse src vers dst (zstd) en flux"""
+    cctx = zstd.ZstdCompressor(level=ZSTD_LEVEL)
+    with open(src, 'rb') as f_in, open(dst, 'wb') as f_out:
+        cctx.copy_stream(f_in, f_out, read_size=COPY_CHUNK, write_size=COPY_CHUNK)
+
+def _compress_one(path: str, archive_dir: Path, cutoff: float, codec: str = 'gzip') -> tuple:
+    """Archive un fichier s'il est antérieur à cutoff; retourne (archivés, MB)"""
+    try:
+        st = os.stat(path)
+        if st.st_mtime >= cutoff:
+            return 0, 0.0
+        
+        # Archiver et compresser
+        name = os.path.basename(path)
+        file_date = datetime.fromtimestamp(st.st_mtime)
+        archive_name = f"{os.path.splitext(name)[0]}_{file_date.strftime('%Y%m%d')}{CODECS[codec]}"
+        if codec == 'zstd':
+            zstd_file(Path(path), archive_dir / archive_name)
+        else:
+            gzip_file(Path(path), archive_dir / archive_name, st.st_size)
+        
+        # Supprimer l'original
+        os.unlink(path)
+        log(f"  📦 {name} → {archive_name}", Colors.GREEN)
+        return 1, st.st_size / (1024 * 1024)
+        
+    except Exception as e:
+        log(f"  ❌ Erreur archivage {path}: {e}", Colors.YELLOW)
+        return 0, 0.0
+
+def archive_old_files(logs_dir: Path, days_old: int = 7, codec: str = 'gzip') -> Dict[str, int]:
+    """Archive les fichiers anciens (compression répartie sur tous les cœurs)"""
     log(f"📦 Archivage des fichiers de plus de {days_old} jours...", Colors.BLUE)
     
+    if codec == 'zstd' and zstd is None:
+        log("  ⚠️ zstandard non installé, archivage en gzip", Colors.YELLOW)
+        codec = 'gzip'
+    
     archive_dir = logs_dir / "archive"
     archive_dir.mkdir(exist_ok=True)
     
-    cutoff_date = datetime.now() - timedelta(days=days_old)
+    cutoff = (datetime.now() - timedelta(days=days_old)).timestamp()
     stats = {'archived': 0, 'size_mb': 0.0}
     
-    for file in logs_dir.glob("*.json"):
-        if file.name.startswith("archive"):
-            continue
-            
-        try:
-            file_date = datetime.fromtimestamp(file.stat().st_mtime)
-            
-            if file_date < cutoff_date:
-                # Archiver et compresser
-                archive_name = f"{file.stem}_{file_date.strftime('%Y%m%d')}.json.gz"
-                archive_path = archive_dir / archive_name
-                
-                with open(file, 'rb') as f_in:
-                    with gzip.open(archive_path, 'wb') as f_out:
-                        shutil.copyfileobj(f_in, f_out)
-                
-                stats['size_mb'] += get_file_size_mb(file)
-                stats['archived'] += 1
-                
-                # Supprimer l'original
-                file.unlink()
-                log(f"  📦 {file.name} → {archive_name}", Colors.GREEN)
-                
-        except Exception as e:
-            log(f"  ❌ Erreur archivage {file}: {e}", Colors.YELLOW)
+    # Pré-filtrer sur le stat() mis en cache par os.scandir: seuls les fichiers à archiver partent aux workers
+    with os.scandir(logs_dir) as it:
+        candidates = [
+            e.path for e in it
+            if e.name.endswith('.json') and not e.name.startswith('archive')
+            and e.is_file() and e.stat().st_mtime < cutoff
+        ]
+    if not candidates:
+        return stats
+    
+    compress = functools.partial(_compress_one, archive_dir=archive_dir, cutoff=cutoff, codec=codec)
+    with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+        for archived, size_mb in executor.map(compress, candidates, chunksize=8):
+            stats['archived'] += archived
+            stats['size_mb'] += size_mb
     
     return stats
 
@@ -82,27 +206,27 @@ def clean_duplicate_previews(logs_dir: Path) -> Dict[str, int]:
     """Nettoie les fichiers preview dupliqués (même source, garder le plus récent)"""
     log("🧹 Nettoyage des previews dupliqués...", Colors.BLUE)
     
-    # Grouper par source
+    # Grouper par source (DirEntry.stat() est mis en cache: un seul stat par fichier)
     sources = {}
-    for file in logs_dir.glob("preview_*.json"):
-        source = file.stem.replace("preview_", "")
-        if source not in sources:
-            sources[source] = []
-        sources[source].append(file)
+    with os.scandir(logs_dir) as it:
+        for e in it:
+            if e.name.startswith('preview_') and e.name.endswith('.json'):
+                source = e.name[:-len('.json')].replace("preview_", "")
+                sources.setdefault(source, []).append(e)
     
     stats = {'removed': 0, 'size_mb': 0.0}
     
-    for source, files in sources.items():
-        if len(files) > 1:
+    for source, entries in sources.items():
+        if len(entries) > 1:
             # Trier par date de modification (plus récent = dernière position)
-            files.sort(key=lambda f: f.stat().st_mtime)
+            entries.sort(key=lambda e: e.stat().st_mtime)
             
             # Garder seulement le plus récent
-            for file in files[:-1]:  # Tous sauf le dernier
-                stats['size_mb'] += get_file_size_mb(file)
+            for e in entries[:-1]:  # Tous sauf le dernier
+                stats['size_mb'] += e.stat().st_size / (1024 * 1024)
                 stats['removed'] += 1
-                file.unlink()
-                log(f"  🗑️ {file.name} (doublon)", Colors.GREEN)
+                os.unlink(e.path)
+                log(f"  🗑️ {e.name} (doublon)", Colors.GREEN)
     
     return stats
 
@@ -110,51 +234,68 @@ def clean_debug_files(logs_dir: Path, max_debug_files: int = 10) -> Dict[str, in
     """Nettoie les fichiers debug en gardant seulement les N plus récents"""
     log(f"🗂️ Nettoyage des fichiers debug (max: {max_debug_files})...", Colors.BLUE)
     
-    # Fichiers debug HTML et PNG
-    debug_files = list(logs_dir.glob("debug_*.html")) + list(logs_dir.glob("debug_*.png"))
-    debug_files.sort(key=lambda f: f.stat().st_mtime, reverse=True)  # Plus récent en premier
+    # Fichiers debug (pages HTML/MHTML, captures PNG/JPEG), en un seul parcours
+    with os.scandir(logs_dir) as it:
+        debug_files = [e for e in it if file_bucket(e.name) in DEBUG_BUCKETS]
     
     stats = {'removed': 0, 'size_mb': 0.0}
     
-    if len(debug_files) > max_debug_files:
-        for file in debug_files[max_debug_files:]:  # Au-delà de la limite
-            stats['size_mb'] += get_file_size_mb(file)
+    excess = len(debug_files) - max_debug_files
+    if excess > 0:
+        # Seuls les plus anciens au-delà de la limite: pas besoin de trier toute la liste
+        for e in heapq.nsmallest(excess, debug_files, key=lambda e: e.stat().st_mtime):
+            stats['size_mb'] += e.stat().st_size / (1024 * 1024)
             stats['removed'] += 1
-            file.unlink()
-            log(f"  🗑️ {file.name} (trop ancien)", Colors.GREEN)
+            os.unlink(e.path)
+            log(f"  🗑️ {e.name} (trop ancien)", Colors.GREEN)
     
     return stats
 
+def preview_has_timestamp(file: str) -> bool:
+    """Vérifie qu'un preview est un objet avec 'timestamp' sans parser tout le fichier"""
+    with open(file, 'rb') as f:
+        if ijson is None:
+            data = _loads(f.read())
+            return isinstance(data, dict) and 'timestamp' in data
+        
+        # Objet/tableau vide: structure invalide sans lancer le parseur
+        if f.read(2) in (b'{}', b'[]'):
+            return False
+        f.seek(0)
+        
+        # 'timestamp' est écrit en tête des previews: s'arrêter dès la première clé trouvée
+        events = ijson.kvitems(f, '')
+        return any(k == 'timestamp' for k, _ in itertools.islice(events, 64))
+
 def cleanup_empty_files(logs_dir: Path) -> Dict[str, int]:
     """Supprime les fichiers vides ou corrompus"""
     log("🔍 Nettoyage des fichiers vides/corrompus...", Colors.BLUE)
     
     stats = {'removed': 0, 'size_mb': 0.0}
     
-    for file in logs_dir.glob("*.json"):
+    with os.scandir(logs_dir) as it:
+        json_files = [entry for entry in it if entry.name.endswith('.json')]
+    
+    for entry in json_files:
         try:
-            if file.stat().st_size == 0:
+            if entry.stat().st_size == 0:
                 # Fichier vide
                 stats['removed'] += 1
-                file.unlink()
-                log(f"  🗑️ {file.name} (vide)", Colors.GREEN)
-            elif file.name.startswith("preview_"):
-                # Vérifier si JSON valide
-                with open(file, 'r') as f:
-                    data = json.load(f)
-                
-                # Vérifier structure minimale
-                if not isinstance(data, dict) or 'timestamp' not in data:
+                os.unlink(entry.path)
+                log(f"  🗑️ {entry.name} (vide)", Colors.GREEN)
+            elif entry.name.startswith("preview_"):
+                # Vérifier structure minimale (JSON valide, objet avec timestamp)
+                if not preview_has_timestamp(entry.path):
                     stats['removed'] += 1
-                    file.unlink()
-                    log(f"  🗑️ {file.name} (structure invalide)", Colors.GREEN)
+                    os.unlink(entry.path)
+                    log(f"  🗑️ {entry.name} (structure invalide)", Colors.GREEN)
                     
-        except (json.JSONDecodeError, OSError) as e:
+        except (*JSON_ERRORS, OSError) as e:
             # Fichier corrompu
-            stats['size_mb'] += get_file_size_mb(file) 
+            stats['size_mb'] += entry.stat().st_size / (1024 * 1024)
             stats['removed'] += 1
-            file.unlink()
-            log(f"  🗑️ {file.name} (corrompu: {e})", Colors.GREEN)
+            os.unlink(entry.path)
+            log(f"  🗑️ {entry.name} (corrompu: {e})", Colors.GREEN)
     
     return stats
 
@@ -162,51 +303,63 @@ def generate_maintenance_report(logs_dir: Path) -> Dict[str, Any]:
     """Génère un rapport de maintenance"""
     log("📋 Génération du rapport de maintenance...", Colors.BLUE)
     
+    total_bytes, entries = _walk_size(str(logs_dir))
+    
     report = {
         'timestamp': datetime.now().isoformat(),
-        'total_size_mb': get_directory_size_mb(logs_dir),
+        'total_size_mb': total_bytes / (1024 * 1024),
         'file_counts': {},
         'largest_files': [],
         'oldest_files': [],
         'recommendations': []
     }
     
-    # Compter les types de fichiers
-    for pattern in ['preview_*.json', 'debug_*.html', 'debug_*.png', '*.json', 'archive/*']:
-        files = list(logs_dir.glob(pattern))
-        file_type = pattern.replace('*', 'X')
-        report['file_counts'][file_type] = len(files)
-    
-    # Plus gros fichiers
-    all_files = [(f, get_file_size_mb(f)) for f in logs_dir.rglob('*') if f.is_file()]
-    all_files.sort(key=lambda x: x[1], reverse=True)
-    
+    # Compter les types de fichiers à partir du même parcours
+    root = str(logs_dir)
+    archive_root = os.path.join(root, 'archive')
+    counts = dict.fromkeys([*BUCKETS.values(), 'X.json', 'archive/X'], 0)
+    all_files = []  # (nom, taille, mtime) relevés une fois pour les sélections top-5
+    for e in entries:
+        st = e.stat()
+        all_files.append((e.name, st.st_size, st.st_mtime))
+        parent = os.path.dirname(e.path)
+        if parent == archive_root:
+            counts['archive/X'] += 1
+        elif parent == root:
+            bucket = file_bucket(e.name)
+            if bucket:
+                counts[bucket] += 1
+            if e.name.endswith('.json'):
+                counts['X.json'] += 1
+    report['file_counts'] = counts
+    
+    # Plus gros fichiers (sélection bornée O(n log 5), sans trier toute la liste)
     report['largest_files'] = [
-        {'name': f.name, 'size_mb': round(size, 2)}
-        for f, size in all_files[:5]
+        {'name': name, 'size_mb': round(size / (1024 * 1024), 2)}
+        for name, size, _ in heapq.nlargest(5, all_files, key=operator.itemgetter(1))
     ]
     
     # Plus anciens fichiers
-    all_files.sort(key=lambda x: x[0].stat().st_mtime)
+    now = time.time()
     report['oldest_files'] = [
         {
-            'name': f.name, 
-            'age_days': (datetime.now() - datetime.fromtimestamp(f.stat().st_mtime)).days
+            'name': name, 
+            'age_days': int((now - mtime) // 86400)
         }
-        for f, _ in all_files[:5]
+        for name, _, mtime in heapq.nsmallest(5, all_files, key=operator.itemgetter(2))
     ]
     
     # Recommandations
     if report['total_size_mb'] > 100:
         report['recommendations'].append("Dossier logs volumineux (>100MB) - Envisager archivage")
     
-    if report['file_counts'].get('debug_X.html', 0) > 20:
+    debug_pages = report['file_counts'].get('debug_X.html', 0) + report['file_counts'].get('debug_X.mhtml', 0)
+    if debug_pages > 20:
         report['recommendations'].append("Trop de fichiers debug - Nettoyer régulièrement")
     
     # Sauvegarder rapport
     report_path = logs_dir / "maintenance_report.json"
-    with open(report_path, 'w') as f:
-        json.dump(report, f, indent=2, ensure_ascii=False)
+    report_path.write_bytes(_dumps_pretty(report))
     
     log(f"📊 Rapport sauvé: {report_path}", Colors.GREEN)
     return report
@@ -232,6 +385,7 @@ def print_summary(stats: Dict[str, Dict[str, int]]):
 def main():
     parser = argparse.ArgumentParser(description="Maintenance et nettoyage du scraper")
     parser.add_argument('--archive-days', type=int, default=7, help='Archiver les fichiers de plus de N jours')
+    parser.add_argument('--codec', choices=sorted(CODECS), default='gzip', help="Format d'archivage (zstd: plus rapide)")
     parser.add_argument('--max-debug', type=int, default=10, help='Nombre max de fichiers debug à garder')
     parser.add_argument('--dry-run', action='store_true', help='Simulation sans modifications')
     parser.add_argument('--report-only', action='store_true', help='Générer seulement le rapport')
@@ -258,7 +412,7 @@ def main():
             return 0
         
         # Opérations de nettoyage
-        stats['archivage'] = archive_old_files(logs_dir, args.archive_days)
+        stats['archivage'] = archive_old_files(logs_dir, args.archive_days, args.codec)
         stats['doublons_preview'] = clean_duplicate_previews(logs_dir)
         stats['debug_files'] = clean_debug_files(logs_dir, args.max_debug)
         stats['fichiers_vides'] = cleanup_empty_files(logs_dir)
@@ -278,5 +432,4 @@ def main():
     return 0
 
 if __name__ == "__main__":
-    import sys
     sys.exit(main())
@@ -3,17 +3,71 @@
 Monitoring en temps réel du scraper
 Surveillance des performances, alertes et métriques
 """
+import asyncio
 import json
+import sys
 import time
 import os
-import subprocess
 from pathlib import Path
-from datetime import datetime, timedelta
+from datetime import datetime
 from typing import Dict, List, Any
 import argparse
 import threading
 from dataclasses import dataclass
 
+try:
+    import orjson
+
+    _loads = orjson.loads
+
+    def _dumps(obj) -> bytes:
+        return orjson.dumps(obj)
+except ImportError:  # stdlib fallback
+    _loads = json.loads
+
+    def _dumps(obj) -> bytes:
+        return json.dumps(obj, ensure_ascii=False).encode('utf-8')
+
+try:
+    import zstandard as zstd
+except ImportError:  # historique en JSONL non compressé
+    zstd = None
+
+ROOT = Path(__file__).resolve().parents[1]
+
+# Historique en JSONL: une ligne par cycle, ajoutée sans relire le fichier
+# (flux zstd multi-frames si zstandard est installé)
+HISTORY_FILE = Path("logs/monitor_history.jsonl.zst" if zstd else "logs/monitor_history.jsonl")
+HISTORY_ERRORS = (OSError, zstd.ZstdError) if zstd else (OSError,)
+# Garder seulement les 24 dernières heures (si interval=30min, max 48 points)
+MAX_HISTORY_POINTS = 48
+# Source du health check: son preview (preview_health-check.json) est écrit pendant
+# le scan des autres previews, il n'est donc jamais lu par get_preview_files_stats
+HEALTH_CHECK_SOURCE = "health-check"
+HEALTH_CHECK_PREVIEW = f"preview_{HEALTH_CHECK_SOURCE}.json"
+
+def _tail_lines(path: Path, k: int, block: int = 8192) -> List[bytes]:
+    """Lit seulement la fin du fichier pour en extraire les k dernières lignes non vides"""
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        span = block * k
+        while True:
+            offset = max(0, size - span)
+            f.seek(offset)
+            lines = f.read().split(b'\n')
+            if offset:
+                lines = lines[1:]  # première ligne probablement tronquée
+            lines = [line for line in lines if line.strip()]
+            if len(lines) >= k or offset == 0:
+                return lines[-k:]
+            span *= 2
+
+def _zstd_lines(path: Path) -> List[bytes]:
+    """Lignes non vides d'un JSONL zstd (taille bornée par la compaction de l'historique)"""
+    with open(path, 'rb') as f:
+        data = zstd.ZstdDecompressor().stream_reader(f, read_across_frames=True).read()
+    return [line for line in data.split(b'\n') if line.strip()]
+
 @dataclass
 class MetricPoint:
     """Point de métrique avec timestamp"""
@@ -22,8 +76,30 @@ class MetricPoint:
     label: str
 
 class ScraperMonitor:
-    def __init__(self, interval: int = 30):
+    # Gabarit du rapport de statut, construit une seule fois
+    _REPORT_TPL = """
+╭─────────────────────────────────────────────────╮
+│  🤖 SCRAPER MONITORING - {time}           │
+├─────────────────────────────────────────────────┤
+│  Status: {status}                                │
+│                                                 │
+│  📊 MÉTRIQUES:                                  │
+│  • Total listings: {total_listings:,}                      │
+│  • Sources actives: {successful_sources}/{total_sources}                         │
+│  • Temps moyen: {avg_response_time:.1f}s                     │
+│  • Health check: {health_time:.1f}s (code: {exit_code})     │
+│                                                 │
+│  💾 DISQUE:                                     │
+│  • Utilisé: {used_mb:.1f} MB                          │
+│  • Libre: {available_mb:.1f} MB                        │
+│                                                 │
+│  🚨 ALERTES: {alert_count}                                  │
+{alerts}╰─────────────────────────────────────────────────╯"""
+    
+    def __init__(self, interval: int = 30, force_print: bool = False):
         self.interval = interval
+        # Hors terminal (daemon, redirection), le rapport n'est affiché que sur demande
+        self.force_print = force_print
         self.running = False
         self.metrics = {
             'response_times': [],
@@ -32,10 +108,17 @@ class ScraperMonitor:
             'error_counts': [],
         }
         self.alerts = []
+        self._history_lines = None  # nombre de lignes de HISTORY_FILE, compté au premier ajout
+        self._hist_fh = None  # fichier d'historique gardé ouvert en ajout (zstd)
+        self._hist_w = None
+        # path -> (st_mtime_ns, st_size, scrape): seuls les previews modifiés sont re-parsés
+        self._preview_cache: Dict[str, tuple] = {}
+        self._scraper = None  # module clean_scraper, importé au premier health check
+        self._logs_bytes = None  # taille de logs/ mesurée par le dernier scan des previews
         
     def log(self, message: str, level: str = "INFO"):
         """Log avec timestamp et niveau"""
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
         levels = {
             "INFO": "📊",
             "WARN": "⚠️",
@@ -59,42 +142,56 @@ class ScraperMonitor:
         }
         
         if not logs_dir.exists():
+            self._logs_bytes = None
             return stats
         
-        preview_files = list(logs_dir.glob("preview_*.json"))
+        # Un seul parcours de logs/: previews du premier niveau + taille totale pour check_disk_space
+        preview_files, self._logs_bytes = self._scan_logs(str(logs_dir))
         stats['total_files'] = len(preview_files)
         
         response_times = []
+        cache = self._preview_cache
+        seen = set()
         
-        for file in preview_files:
+        for entry in preview_files:
             try:
-                with open(file, 'r') as f:
-                    data = json.load(f)
-                
-                # Métriques par fichier
-                count = data.get('count', 0)
-                blocked = data.get('blocked', True)
-                elapsed = data.get('elapsed_sec', 0)
+                st = entry.stat()
+                seen.add(entry.path)
+                cached = cache.get(entry.path)
+                if cached and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+                    scrape = cached[2]
+                else:
+                    with open(entry.path, 'rb') as f:
+                        data = _loads(f.read())
+                    
+                    # Métriques par fichier
+                    scrape = {
+                        'source': entry.name[:-len('.json')].replace('preview_', ''),
+                        'count': data.get('count', 0),
+                        'blocked': data.get('blocked', True),
+                        'elapsed': data.get('elapsed_sec', 0),
+                        'timestamp': data.get('timestamp', st.st_mtime)
+                    }
+                    cache[entry.path] = (st.st_mtime_ns, st.st_size, scrape)
                 
+                count = scrape['count']
                 stats['total_listings'] += count
-                response_times.append(elapsed)
+                response_times.append(scrape['elapsed'])
                 
-                if blocked:
+                if scrape['blocked']:
                     stats['blocked_sources'] += 1
                 elif count > 0:
                     stats['successful_sources'] += 1
                 
-                # Garder les derniers scrapes
-                stats['latest_scrapes'].append({
-                    'source': file.stem.replace('preview_', ''),
-                    'count': count,
-                    'blocked': blocked,
-                    'elapsed': elapsed,
-                    'timestamp': data.get('timestamp', file.stat().st_mtime)
-                })
+                # Garder les derniers scrapes (copie: le tri et les consommateurs ne touchent pas au cache)
+                stats['latest_scrapes'].append(dict(scrape))
                 
             except Exception as e:
-                self.log(f"Erreur lecture {file}: {e}", "ERROR")
+                self.log(f"Erreur lecture {entry.path}: {e}", "ERROR")
+        
+        # Oublier les previews supprimés depuis le dernier cycle
+        for path in cache.keys() - seen:
+            del cache[path]
         
         if response_times:
             stats['avg_response_time'] = sum(response_times) / len(response_times)
@@ -104,61 +201,86 @@ class ScraperMonitor:
         
         return stats
     
+    def _load_scraper(self):
+        """Importe clean_scraper une seule fois pour le health check en process"""
+        if self._scraper is None:
+            if str(ROOT) not in sys.path:
+                sys.path.insert(0, str(ROOT))
+            from scraper.spiders import clean_scraper
+            self._scraper = clean_scraper
+        return self._scraper
+    
     def run_health_check(self) -> Dict[str, Any]:
-        """Exécute un check de santé du scraper"""
+        """Exécute un check de santé du scraper (dans le process, sans relancer d'interpréteur)"""
+        return asyncio.run(self._run_health_check_async())
+    
+    async def _run_health_check_async(self) -> Dict[str, Any]:
+        """Health check awaitable, pour la boucle asyncio de monitor_loop"""
         self.log("Exécution health check...", "INFO")
         
-        start_time = time.time()
+        start_time = time.perf_counter()
         
         try:
-            # Test rapide avec timeout court
-            result = subprocess.run([
-                "python3", "scraper/spiders/clean_scraper.py",
-                "--where", "health-check",
-                "--what", "monitor",
-                "--timeout", "3000"
-            ], 
-            capture_output=True, 
-            text=True, 
-            timeout=15,
-            cwd=Path(__file__).resolve().parents[1]
-            )
+            clean_scraper = self._load_scraper()
             
-            elapsed = time.time() - start_time
+            # Test rapide avec timeout court; 15s plus la fermeture du navigateur,
+            # elle-même bornée (TEARDOWN_TIMEOUT_SEC) quand wait_for annule le scrape
+            exit_code = await asyncio.wait_for(
+                clean_scraper.run_once(where="health-check", what="monitor", timeout_ms=3000,
+                                      source=HEALTH_CHECK_SOURCE),
+                timeout=15
+            )
             
             return {
-                'success': result.returncode in [0, 2],  # 0=success, 2=blocked (OK)
-                'response_time': elapsed,
-                'exit_code': result.returncode,
-                'stdout': result.stdout[-200:] if result.stdout else "",
-                'stderr': result.stderr[-200:] if result.stderr else ""
+                'success': exit_code in [0, 2],  # 0=success, 2=blocked (OK)
+                'response_time': time.perf_counter() - start_time,
+                'exit_code': exit_code
             }
             
-        except subprocess.TimeoutExpired:
+        except asyncio.TimeoutError:
             return {
                 'success': False,
-                'response_time': time.time() - start_time,
+                'response_time': time.perf_counter() - start_time,
                 'exit_code': -1,
                 'error': 'Timeout'
             }
         except Exception as e:
             return {
                 'success': False,
-                'response_time': time.time() - start_time,
+                'response_time': time.perf_counter() - start_time,
                 'exit_code': -2,
                 'error': str(e)
             }
     
-    def check_disk_space(self) -> Dict[str, Any]:
-        """Vérifie l'espace disque dans logs/"""
+    @staticmethod
+    def _scan_logs(root: str) -> tuple:
+        """Previews de root et taille totale en octets (parcours os.scandir itératif)"""
+        previews = []
+        total = 0
+        stack = [root]
+        while stack:
+            path = stack.pop()
+            with os.scandir(path) as it:
+                for e in it:
+                    if e.is_dir(follow_symlinks=False):
+                        stack.append(e.path)
+                    elif e.is_file(follow_symlinks=False):
+                        total += e.stat().st_size
+                        if (path == root and e.name.startswith('preview_') and e.name.endswith('.json')
+                                and e.name != HEALTH_CHECK_PREVIEW):
+                            previews.append(e)
+        return previews, total
+    
+    def check_disk_space(self, used_mb: float = None) -> Dict[str, Any]:
+        """Vérifie l'espace disque dans logs/ (used_mb précalculé: seul statvfs est appelé)"""
         logs_dir = Path("logs")
         if not logs_dir.exists():
             return {'available_mb': 0, 'used_mb': 0, 'warning': True}
         
         try:
             # Taille du dossier logs
-            total_size = sum(f.stat().st_size for f in logs_dir.rglob('*') if f.is_file())
-            used_mb = total_size / (1024 * 1024)
+            if used_mb is None:
+                used_mb = self._scan_logs(str(logs_dir))[1] / (1024 * 1024)
             
             # Espace libre sur le disque
             stat = os.statvfs(logs_dir)
@@ -172,6 +294,12 @@ class ScraperMonitor:
         except Exception as e:
             return {'error': str(e), 'warning': True}
     
+    def _disk_from_scan(self) -> Dict[str, Any]:
+        """check_disk_space avec la taille mesurée par le dernier get_preview_files_stats"""
+        if self._logs_bytes is None:
+            return self.check_disk_space()
+        return self.check_disk_space(used_mb=self._logs_bytes / (1024 * 1024))
+    
     def detect_anomalies(self, current_stats: Dict[str, Any]) -> List[str]:
         """Détecte des anomalies dans les métriques"""
         anomalies = []
@@ -191,11 +319,11 @@ class ScraperMonitor:
         if current_stats['total_listings'] == 0 and current_stats['successful_sources'] > 0:
             anomalies.append("Aucun listing récupéré malgré des sources actives")
         
-        # Vérifier les scrapes récents (dernière heure)
+        # Vérifier les scrapes récents (dernière heure), en comparant des epochs
+        cutoff = time.time() - 3600
         recent_scrapes = [
             s for s in current_stats['latest_scrapes']
-            if isinstance(s['timestamp'], (int, float)) and 
-            datetime.fromtimestamp(s['timestamp']) > datetime.now() - timedelta(hours=1)
+            if isinstance(s['timestamp'], (int, float)) and s['timestamp'] > cutoff
         ]
         
         if len(recent_scrapes) == 0 and total_sources > 0:
@@ -203,72 +331,86 @@ class ScraperMonitor:
         
         return anomalies
     
-    def save_metrics_history(self, stats: Dict[str, Any], health: Dict[str, Any]):
-        """Sauvegarde l'historique des métriques"""
-        history_file = Path("logs/monitor_history.json")
+    def save_metrics_history(self, stats: Dict[str, Any], health: Dict[str, Any], disk: Dict[str, Any] = None):
+        """Ajoute le point courant à l'historique des métriques (JSONL)"""
+        history_file = HISTORY_FILE
         
-        # Charger historique existant
-        history = []
-        if history_file.exists():
+        if self._history_lines is None:
             try:
-                with open(history_file, 'r') as f:
-                    history = json.load(f)
-            except:
-                history = []
+                if zstd:
+                    self._history_lines = len(_zstd_lines(history_file))
+                else:
+                    with open(history_file, 'rb') as f:
+                        self._history_lines = sum(1 for _ in f)
+            except HISTORY_ERRORS:
+                self._history_lines = 0
         
-        # Ajouter point actuel
         point = {
             'timestamp': datetime.now().isoformat(),
             'stats': stats,
             'health': health,
-            'disk': self.check_disk_space()
+            'disk': disk if disk is not None else self.check_disk_space()
         }
-        history.append(point)
+        line = _dumps(point) + b'\n'
+        if zstd:
+            if self._hist_w is None:
+                self._hist_fh = open(history_file, 'ab')
+                cctx = zstd.ZstdCompressor(level=3, write_checksum=True)
+                self._hist_w = cctx.stream_writer(self._hist_fh, closefd=False)
+            self._hist_w.write(line)
+            # Terminer la frame à chaque cycle: le fichier reste lisible si le process s'arrête
+            self._hist_w.flush(zstd.FLUSH_FRAME)
+        else:
+            with open(history_file, 'ab') as f:
+                f.write(line)
+        self._history_lines += 1
         
-        # Garder seulement les 24 dernières heures (si interval=30min, max 48 points)
-        max_points = 48
-        if len(history) > max_points:
-            history = history[-max_points:]
-        
-        # Sauvegarder
-        with open(history_file, 'w') as f:
-            json.dump(history, f, indent=2, ensure_ascii=False)
+        # Compacter seulement quand le fichier dépasse le double de la limite (coût amorti O(1))
+        if self._history_lines > 2 * MAX_HISTORY_POINTS:
+            if zstd:
+                self._close_history()
+                tail = _zstd_lines(history_file)[-MAX_HISTORY_POINTS:]
+                data = zstd.ZstdCompressor(level=3, write_checksum=True).compress(b'\n'.join(tail) + b'\n')
+            else:
+                tail = _tail_lines(history_file, MAX_HISTORY_POINTS)
+                data = b'\n'.join(tail) + b'\n'
+            history_file.write_bytes(data)
+            self._history_lines = len(tail)
+    
+    def _close_history(self):
+        """Ferme le flux d'ajout zstd de l'historique (rouvert au prochain point)"""
+        if self._hist_w is not None:
+            self._hist_w.close()
+            self._hist_fh.close()
+            self._hist_w = self._hist_fh = None
     
-    def generate_status_report(self, stats: Dict[str, Any], health: Dict[str, Any]) -> str:
+    def generate_status_report(self, stats: Dict[str, Any], health: Dict[str, Any], disk: Dict[str, Any] = None) -> str:
         """Génère un rapport de statut"""
-        disk = self.check_disk_space()
+        if disk is None:
+            disk = self.check_disk_space()
         anomalies = self.detect_anomalies(stats)
         
         status = "🟢 SAIN" if health['success'] and len(anomalies) == 0 else "🟡 ATTENTION" if health['success'] else "🔴 CRITIQUE"
         
-        report = f"""
-╭─────────────────────────────────────────────────╮
-│  🤖 SCRAPER MONITORING - {datetime.now().strftime('%H:%M:%S')}           │
-├─────────────────────────────────────────────────┤
-│  Status: {status}                                │
-│                                                 │
-│  📊 MÉTRIQUES:                                  │
-│  • Total listings: {stats['total_listings']:,}                      │
-│  • Sources actives: {stats['successful_sources']}/{stats['successful_sources'] + stats['blocked_sources']}                         │
-│  • Temps moyen: {stats['avg_response_time']:.1f}s                     │
-│  • Health check: {health['response_time']:.1f}s (code: {health['exit_code']})     │
-│                                                 │
-│  💾 DISQUE:                                     │
-│  • Utilisé: {disk.get('used_mb', 0):.1f} MB                          │
-│  • Libre: {disk.get('available_mb', 0):.1f} MB                        │
-│                                                 │
-│  🚨 ALERTES: {len(anomalies)}                                  │
-"""
-        
-        for anomaly in anomalies[:3]:  # Max 3 alertes
-            report += f"│  • {anomaly[:43]:43} │\n"
-        
-        report += "╰─────────────────────────────────────────────────╯"
+        report = self._REPORT_TPL.format_map({
+            'time': datetime.now().strftime('%H:%M:%S'),
+            'status': status,
+            'total_listings': stats['total_listings'],
+            'successful_sources': stats['successful_sources'],
+            'total_sources': stats['successful_sources'] + stats['blocked_sources'],
+            'avg_response_time': stats['avg_response_time'],
+            'health_time': health['response_time'],
+            'exit_code': health['exit_code'],
+            'used_mb': disk.get('used_mb', 0),
+            'available_mb': disk.get('available_mb', 0),
+            'alert_count': len(anomalies),
+            'alerts': ''.join(f"│  • {anomaly[:43].ljust(43)} │\n" for anomaly in anomalies[:3]),  # Max 3 alertes
+        })
         
         return report
     
-    def monitor_loop(self):
-        """Boucle principale de monitoring"""
+    async def monitor_loop(self):
+        """Boucle principale de monitoring (health check et scan de logs/ en parallèle)"""
         self.log("🚀 Démarrage du monitoring...", "SUCCESS")
         self.log(f"📊 Intervalle: {self.interval}s", "INFO")
         
@@ -279,34 +421,37 @@ class ScraperMonitor:
                 iteration += 1
                 self.log(f"--- Cycle {iteration} ---", "INFO")
                 
-                # Collecter métriques
-                stats = self.get_preview_files_stats()
-                health = self.run_health_check()
+                # Collecter métriques: le scan ignore le preview du health check, les deux
+                # étapes sont indépendantes et la durée du cycle est la plus longue des deux
+                health, stats = await asyncio.gather(
+                    self._run_health_check_async(),
+                    asyncio.to_thread(self.get_preview_files_stats),
+                )
+                disk = self._disk_from_scan()  # une seule mesure par cycle, sans re-parcourir logs/
                 
                 # Sauvegarder historique
-                self.save_metrics_history(stats, health)
+                self.save_metrics_history(stats, health, disk)
                 
                 # Générer rapport
-                report = self.generate_status_report(stats, health)
-                print(report)
+                if sys.stdout.isatty() or self.force_print:
+                    print(self.generate_status_report(stats, health, disk))
                 
                 # Alertes critiques
                 if not health['success']:
                     self.log("🚨 ALERTE: Health check échoué!", "ALERT")
                 
-                disk = self.check_disk_space()
                 if disk.get('warning', False):
                     self.log(f"🚨 ALERTE: Espace disque faible ({disk.get('available_mb', 0):.1f} MB)", "ALERT")
                 
                 # Attendre prochain cycle
-                time.sleep(self.interval)
+                await asyncio.sleep(self.interval)
                 
             except KeyboardInterrupt:
                 self.log("👋 Arrêt demandé par l'utilisateur", "INFO")
                 break
             except Exception as e:
                 self.log(f"💥 Erreur monitoring: {e}", "ERROR")
-                time.sleep(5)  # Pause courte avant retry
+                await asyncio.sleep(5)  # Pause courte avant retry
         
         self.log("🛑 Monitoring arrêté", "INFO")
     
@@ -317,7 +462,7 @@ class ScraperMonitor:
             return
         
         self.running = True
-        self.monitor_thread = threading.Thread(target=self.monitor_loop, daemon=True)
+        self.monitor_thread = threading.Thread(target=asyncio.run, args=(self.monitor_loop(),), daemon=True)
         self.monitor_thread.start()
     
     def stop(self):
@@ -325,12 +470,13 @@ class ScraperMonitor:
         self.running = False
         if hasattr(self, 'monitor_thread'):
             self.monitor_thread.join(timeout=5)
+        self._close_history()
     
     def run_once(self):
         """Exécute un cycle de monitoring unique"""
-        stats = self.get_preview_files_stats()
         health = self.run_health_check()
-        report = self.generate_status_report(stats, health)
+        stats = self.get_preview_files_stats()
+        report = self.generate_status_report(stats, health, self._disk_from_scan())
         print(report)
         return stats, health
 
@@ -339,9 +485,10 @@ def main():
     parser.add_argument('--interval', type=int, default=30, help='Intervalle en secondes (défaut: 30)')
     parser.add_argument('--once', action='store_true', help='Exécuter un cycle unique')
     parser.add_argument('--daemon', action='store_true', help='Mode daemon (arrière-plan)')
+    parser.add_argument('--print-report', action='store_true', help='Afficher le rapport même hors terminal')
     args = parser.parse_args()
     
-    monitor = ScraperMonitor(interval=args.interval)
+    monitor = ScraperMonitor(interval=args.interval, force_print=args.print_report)
     
     if args.once:
         # Cycle unique
@@ -361,13 +508,13 @@ def main():
             monitor.stop()
     else:
         # Mode interactif
+        monitor.running = True
         try:
-            monitor.monitor_loop()
+            asyncio.run(monitor.monitor_loop())
         except KeyboardInterrupt:
             pass
     
     return 0
 
 if __name__ == "__main__":
-    import sys
     sys.exit(main())
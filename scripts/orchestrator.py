@@ -3,12 +3,19 @@
 Orchestrateur global pour le scraper
 Lance tous les tests, génère le dashboard et démarre le monitoring
 """
+import os
+import signal
 import subprocess
+import threading
 import time
 import sys
+from collections import deque
 from pathlib import Path
 import argparse
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+ROOT = Path(__file__).resolve().parents[1]
+DASHBOARD_PATH = ROOT / "logs/dashboard.html"
 
 class Colors:
     RED = '\033[91m'
@@ -21,31 +28,88 @@ class Colors:
     BOLD = '\033[1m'
     RESET = '\033[0m'
 
-def log(message: str, color: str = Colors.WHITE):
-    """Log avec couleur et timestamp"""
-    timestamp = datetime.now().strftime("%H:%M:%S")
-    print(f"[{timestamp}] {color}{message}{Colors.RESET}")
+def log(message: str, color: str = Colors.WHITE, flush: bool = False):
+    """Log avec couleur et timestamp (sortie tamponnée, vidée aux changements de phase)"""
+    sys.stdout.write(f"[{time.strftime('%H:%M:%S')}] {color}{message}{Colors.RESET}\n")
+    if flush:
+        sys.stdout.flush()
+
+# Octets de stderr conservés par sous-processus (seule la fin est affichée en cas d'échec)
+STDERR_TAIL = 4096
+# Attente max du lecteur de stderr après la fin (ou le kill) du sous-processus
+DRAIN_GRACE = 5
+
+# Sous-processus en cours: chacun est dans sa propre session, Ctrl+C ne les atteint pas
+_running = set()
+_running_lock = threading.Lock()
+
+def _drain_tail(stream, tail: deque):
+    """Vide un pipe en ne gardant que ses derniers octets"""
+    try:
+        for chunk in iter(lambda: stream.read(STDERR_TAIL), b''):
+            tail.extend(chunk)
+    except (OSError, ValueError):  # pipe fermé par run_command
+        pass
+
+def _kill_tree(proc: subprocess.Popen):
+    """Tue le groupe de processus (driver Playwright, Chromium...), pas seulement l'enfant direct"""
+    if hasattr(os, 'killpg'):
+        try:
+            os.killpg(proc.pid, signal.SIGKILL)
+            return
+        except ProcessLookupError:
+            return
+        except OSError:
+            pass
+    proc.kill()
+
+def _kill_running():
+    """Tue tous les sous-processus lancés par run_command encore en cours"""
+    with _running_lock:
+        procs = list(_running)
+    for proc in procs:
+        _kill_tree(proc)
 
 def run_command(cmd: list, description: str, critical: bool = True) -> bool:
-    """Exécute une commande avec gestion d'erreur"""
+    """Exécute une commande avec gestion d'erreur (mémoire bornée quelle que soit la sortie)"""
     log(f"🚀 {description}...", Colors.CYAN)
     
     try:
-        result = subprocess.run(
+        proc = subprocess.Popen(
             cmd, 
-            cwd=Path(__file__).resolve().parents[1],
-            capture_output=True,
-            text=True,
-            timeout=300  # 5 minutes max
+            cwd=ROOT,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            bufsize=0,  # pipe brut: close() ne bloque pas si le lecteur est encore dans read()
+            start_new_session=hasattr(os, 'killpg')
         )
+        with _running_lock:
+            _running.add(proc)
+        stderr_tail = deque(maxlen=STDERR_TAIL)
+        drain = threading.Thread(target=_drain_tail, args=(proc.stderr, stderr_tail), daemon=True)
+        drain.start()
         
-        if result.returncode == 0:
+        try:
+            returncode = proc.wait(timeout=300)  # 5 minutes max
+        except BaseException:  # timeout, mais aussi Ctrl+C: ne pas laisser d'orphelins
+            _kill_tree(proc)
+            proc.wait()
+            raise
+        finally:
+            with _running_lock:
+                _running.discard(proc)
+            # Un petit-enfant hors du groupe peut garder stderr ouvert: ne jamais attendre l'EOF indéfiniment
+            drain.join(timeout=DRAIN_GRACE)
+            proc.stderr.close()
+        
+        if returncode == 0:
             log(f"✅ {description} - Succès", Colors.GREEN)
             return True
         else:
-            log(f"❌ {description} - Échec (code: {result.returncode})", Colors.RED)
+            log(f"❌ {description} - Échec (code: {returncode})", Colors.RED)
             if critical:
-                log(f"   stderr: {result.stderr[:200]}...", Colors.RED)
+                stderr = bytes(stderr_tail)[-200:].decode('utf-8', errors='replace')
+                log(f"   stderr: ...{stderr}", Colors.RED)
             return not critical
             
     except subprocess.TimeoutExpired:
@@ -63,38 +127,50 @@ def run_demo_scrapes():
         {
             'where': 'montreal',
             'what': 'condo-demo', 
-            'args': ['--timeout', '10000'],
+            'args': ['--source', 'demo-montreal', '--timeout', '10000'],
             'description': 'Scrape Montreal condos (WAF attendu)'
         },
         {
             'where': 'demo-mock',
             'what': 'test-data',
-            'args': ['--dom', '--source', 'mock', '--timeout', '5000'],
+            'args': ['--dom', '--source', 'demo-mock', '--timeout', '5000'],
             'description': 'Test extraction DOM avec données mock'
         },
         {
             'where': 'debug-test',
             'what': 'visual-debug',
-            'args': ['--debug', '--timeout', '8000'],
+            'args': ['--debug', '--source', 'demo-debug', '--timeout', '8000'],
             'description': 'Test mode debug avec captures'
         }
     ]
     
-    success_count = 0
-    
-    for config in demo_configs:
-        cmd = [
-            'python3', 'scraper/spiders/clean_scraper.py',
-            '--where', config['where'],
-            '--what', config['what']
-        ] + config['args']
-        
-        if run_command(cmd, config['description'], critical=False):
-            success_count += 1
-        
-        time.sleep(2)  # Pause entre scrapes
+    # Les fichiers de sortie sont nommés d'après --source: une source distincte par démo
+    # pour que les scrapes parallèles n'écrivent pas le même preview_*/debug_*
+    executor = ThreadPoolExecutor(max_workers=len(demo_configs))
+    try:
+        futures = [
+            executor.submit(
+                run_command,
+                [
+                    'python3', 'scraper/spiders/clean_scraper.py',
+                    '--where', config['where'],
+                    '--what', config['what']
+                ] + config['args'],
+                config['description'],
+                critical=False
+            )
+            for config in demo_configs
+        ]
+        success_count = sum(f.result() for f in as_completed(futures))
+    except BaseException:
+        # Ctrl+C n'arrive qu'au thread principal: tuer les scrapes en cours pour
+        # débloquer les workers, sans attendre leur fin pour propager l'interruption
+        _kill_running()
+        executor.shutdown(wait=False, cancel_futures=True)
+        raise
+    executor.shutdown()
     
-    log(f"📊 Scrapes de démo: {success_count}/{len(demo_configs)} réussis", Colors.CYAN)
+    log(f"📊 Scrapes de démo: {success_count}/{len(demo_configs)} réussis", Colors.CYAN, flush=True)
     return success_count > 0
 
 def main():
@@ -106,15 +182,20 @@ def main():
     parser.add_argument('--monitor-interval', type=int, default=60, help='Intervalle de monitoring (secondes)')
     args = parser.parse_args()
     
+    # Pas de write(2) par ligne même sur un terminal: log() vide le tampon aux débuts de phase
+    if hasattr(sys.stdout, 'reconfigure'):
+        sys.stdout.reconfigure(line_buffering=False)
+    
     log("🤖 ORCHESTRATEUR SCRAPER - Démarrage", Colors.BOLD)
     log("=" * 60, Colors.MAGENTA)
     
     start_time = time.time()
     
     # Phase 1: Tests automatisés
+    # (seule: test_suite.py lit et compte les fichiers de logs/ que les scrapes de démo écrivent)
     if not args.skip_tests:
         log("\n🧪 PHASE 1: Tests automatisés", Colors.BOLD)
-        log("-" * 40, Colors.BLUE)
+        log("-" * 40, Colors.BLUE, flush=True)
         
         success = run_command(
             ['python3', 'scripts/test_suite.py'],
@@ -129,16 +210,16 @@ def main():
     # Phase 2: Scrapes de démonstration
     if not args.skip_demo:
         log("\n🎯 PHASE 2: Scrapes de démonstration", Colors.BOLD) 
-        log("-" * 40, Colors.BLUE)
+        log("-" * 40, Colors.BLUE, flush=True)
         
         run_demo_scrapes()
     else:
         log("⏭️ Scrapes de démo ignorés", Colors.YELLOW)
     
-    # Phase 3: Génération du dashboard
+    # Phase 3: Génération du dashboard (après les scrapes: il lit les previews qu'ils produisent)
     if not args.skip_dashboard:
         log("\n📊 PHASE 3: Génération du dashboard", Colors.BOLD)
-        log("-" * 40, Colors.BLUE)
+        log("-" * 40, Colors.BLUE, flush=True)
         
         success = run_command(
             ['python3', 'scripts/generate_dashboard.py'],
@@ -147,24 +228,23 @@ def main():
         )
         
         if success:
-            dashboard_path = Path(__file__).resolve().parents[1] / "logs/dashboard.html"
-            log(f"🌐 Dashboard disponible: file://{dashboard_path}", Colors.GREEN)
+            log(f"🌐 Dashboard disponible: file://{DASHBOARD_PATH}", Colors.GREEN)
     else:
         log("⏭️ Dashboard ignoré", Colors.YELLOW)
     
     # Phase 4: Monitoring en temps réel
     if args.monitor:
         log("\n📡 PHASE 4: Monitoring en temps réel", Colors.BOLD)
-        log("-" * 40, Colors.BLUE)
+        log("-" * 40, Colors.BLUE, flush=True)
         
         log(f"🔄 Démarrage monitoring (intervalle: {args.monitor_interval}s)", Colors.CYAN)
-        log("💡 Appuyez sur Ctrl+C pour arrêter", Colors.WHITE)
+        log("💡 Appuyez sur Ctrl+C pour arrêter", Colors.WHITE, flush=True)
         
         try:
             subprocess.run([
                 'python3', 'scripts/monitor.py',
                 '--interval', str(args.monitor_interval)
-            ], cwd=Path(__file__).resolve().parents[1])
+            ], cwd=ROOT)
         except KeyboardInterrupt:
             log("\n👋 Monitoring arrêté", Colors.CYAN)
     
@@ -179,7 +259,7 @@ def main():
     log("• 🌐 Ouvrir logs/dashboard.html pour voir les résultats", Colors.WHITE)
     log("• 📊 Consulter logs/test_report.json pour les détails des tests", Colors.WHITE)
     log("• 🔍 Vérifier logs/preview_*.json pour les données scrapées", Colors.WHITE)
-    log("• 🚀 Lancer scripts/monitor.py --once pour un status check", Colors.WHITE)
+    log("• 🚀 Lancer scripts/monitor.py --once pour un status check", Colors.WHITE, flush=True)
     
     return 0
 
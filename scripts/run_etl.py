@@ -1,10 +1,11 @@
 from pathlib import Path
+import atexit
+import io
 import sys
 import os
-import json
 import orjson
-from typing import Optional, Protocol, Any, cast, Iterable, List, Dict, Callable
-from collections.abc import Mapping
+from typing import Optional, Protocol, Any, cast, List, Dict, Callable, Tuple
+from concurrent.futures import ThreadPoolExecutor
 
 # Define a protocol so type checkers know the extractor exposes an extract(...) method.
 class ExtractorProtocol(Protocol):
@@ -27,180 +28,154 @@ def _import(name: str, attr: Optional[str] = None):
         return getattr(module, attr) if attr else module
     except Exception as e:
         raise ImportError(f"Could not import {name}{'.' + attr if attr else ''}: {e}")
-        raise ImportError(f"Could not import {name}{'.' + attr if attr else ''}: {e}")
 
-def _resolve_callable(obj, *candidate_names):
-    # If it's already callable, return it.
+def _resolve_callable(obj, *candidate_names) -> Callable[..., Any]:
+    # Resolved once at import time so the record loops call the function directly.
     if callable(obj):
         return obj
     # If it's a module-like object, try to find a callable attribute.
     for name in candidate_names:
-        if hasattr(obj, name) and callable(getattr(obj, name)):
-            return getattr(obj, name)
-    # Fall back to the original object (may raise later if used incorrectly).
-    return obj
+        func = getattr(obj, name, None)
+        if callable(func):
+            return func
+    raise ImportError(f"{getattr(obj, '__name__', obj)!r} exposes none of {', '.join(candidate_names)}")
 
-to_sqm = _resolve_callable(_import("etl.normalize"), "to_sqm", "convert", "to_square_meters")
-normalize_currency = _resolve_callable(_import("etl.normalize"), "normalize_currency", "normalize")
+to_sqm_many = _import("etl.normalize", "to_sqm_many")
+normalize_currency_many = _import("etl.normalize", "normalize_currency_many")
 dedupe_records = _resolve_callable(_import("etl.dedupe"), "dedupe_records", "dedupe")
-validate_listing = _resolve_callable(_import("extractor.schema"), "validate_listing")
+validate_listing = _resolve_callable(_import("etl.schema"), "validate_listing")
+validate_listings = _import("etl.schema", "validate_listings")
+dump_listings = _import("etl.schema", "dump_listings")
 geocode_address = _resolve_callable(_import("etl.geocode"), "geocode_address", "geocode")
-neighborhood_from_geojson = _resolve_callable(_import("etl.geocode"), "neighborhood_from_geojson")
-OllamaExtractor = _resolve_callable(_import("extractor.llm_ollama"), "OllamaExtractor", "Ollama")
+NeighborhoodIndex = _import("etl.geocode", "NeighborhoodIndex")
+GeocodeCache = _import("etl.geocode", "GeocodeCache")
+OllamaExtractor = _resolve_callable(_import("etl.llm_ollama"), "OllamaExtractor", "Ollama")
+
+# JSON event lines go to stdout as bytes through one 64 KB buffer: a write(2) per block
+# instead of per record, and no orjson bytes -> str -> bytes round-trip through print().
+_event_out: Optional[io.BufferedWriter] = None
+
+def _emit(event: Dict[str, Any]) -> None:
+    global _event_out
+    if _event_out is None:
+        sys.stdout.flush()
+        _event_out = io.BufferedWriter(io.FileIO(sys.stdout.fileno(), 'wb', closefd=False), buffer_size=65536)
+        atexit.register(_event_out.flush)
+    _event_out.write(orjson.dumps(event))
+    _event_out.write(b"\n")
+
+
+_TRUTHY = frozenset({"1", "true", "yes", "on"})
+
+def _envflag(name: str, default: str = "1") -> bool:
+    return (os.environ.get(name, default) or "").strip().lower() in _TRUTHY
+
+def _envint(name: str, default: int, minimum: int = 1) -> int:
+    # Invalid or out-of-range values fall back to the default instead of aborting the run
+    raw = os.environ.get(name)
+    try:
+        value = int(raw) if raw is not None else default
+    except ValueError:
+        _emit({"event": "invalid_env", "name": name, "value": raw})
+        return default
+    return value if value >= minimum else default
+
+
+def _llm_fallback(extractor: ExtractorProtocol, r: Dict[str, Any]) -> Tuple[bool, Any]:
+    """Read a record's raw HTML and run the LLM extractor on it; returns (had_html, result)."""
+    html = None
+    raw_path = r.get('raw_html_path')
+    try:
+        if raw_path and Path(raw_path).exists():
+            html = Path(raw_path).read_text(encoding='utf-8', errors='ignore')
+    except Exception:
+        html = None
+    if not html:
+        return False, None
+    return True, extractor.extract(url=r.get('url', ''), title=r.get('title'), html=html)
 
 
 def main() -> None:
     data_path = Path('data/listings.json')
-    recs = json.loads(data_path.read_text()) if data_path.exists() else []
+    recs = orjson.loads(data_path.read_bytes()) if data_path.exists() else []
     total = len(recs)
-    use_ollama = os.getenv("AI_SCRAPER_USE_OLLAMA", "1").lower() in ("1", "true", "yes", "on")
-    ollama_timeout = int(os.getenv("AI_SCRAPER_OLLAMA_TIMEOUT", "5"))
+    use_ollama = _envflag("AI_SCRAPER_USE_OLLAMA")
+    ollama_timeout = _envint("AI_SCRAPER_OLLAMA_TIMEOUT", 5)
+    llm_workers = _envint("AI_SCRAPER_LLM_WORKERS", 4)
     extractor: Optional[ExtractorProtocol] = None
 
     # initialize working state
-    cleaned = []
     llm_attempts = 0
     llm_success = 0
 
     if use_ollama:
         try:
-            # OllamaExtractor may be the class/function itself or a module that exposes the class
-            if callable(OllamaExtractor):
-                extractor = cast(ExtractorProtocol, OllamaExtractor(timeout=ollama_timeout))
-            else:
-                candidate = getattr(OllamaExtractor, "OllamaExtractor", None)
-                if callable(candidate):
-                    extractor = cast(ExtractorProtocol, candidate(timeout=ollama_timeout))
-                else:
-                    raise TypeError("OllamaExtractor is not callable and does not expose a callable 'OllamaExtractor'")
+            extractor = cast(ExtractorProtocol, OllamaExtractor(timeout=ollama_timeout, max_connections=llm_workers))
         except Exception as e:
-            print(orjson.dumps({"event": "ollama_init_failed", "error": str(e)}).decode())
+            _emit({"event": "ollama_init_failed", "error": str(e)})
             extractor = None
 
-    for r in recs:
-        cur = r.get('currency')
-        if callable(normalize_currency):
-            r['currency'] = normalize_currency(cur)
-        elif hasattr(normalize_currency, 'normalize_currency') and callable(getattr(normalize_currency, 'normalize_currency')):
-            r['currency'] = normalize_currency.normalize_currency(cur)
-        elif hasattr(normalize_currency, 'normalize') and callable(getattr(normalize_currency, 'normalize')):
-            r['currency'] = normalize_currency.normalize(cur)
-        else:
-            # unknown shape (module without a callable); keep original value
-            r['currency'] = cur
+    # Normalize currency and area column-wise (NumPy arrays), then scatter back per record
+    currencies = normalize_currency_many([r.get('currency') for r in recs])
+    areas_sqm = to_sqm_many([r.get('area') for r in recs], [r.get('area_unit') for r in recs])
+    for r, cur, area_sqm in zip(recs, currencies, areas_sqm):
+        r['currency'] = cur
         if r.get('area') and r.get('area_unit'):
-            area = r['area']
-            unit = r['area_unit']
-            if callable(to_sqm):
-                r['area_sqm'] = to_sqm(area, unit)
-            elif hasattr(to_sqm, 'to_sqm') and callable(getattr(to_sqm, 'to_sqm')):
-                r['area_sqm'] = to_sqm.to_sqm(area, unit)
-            elif hasattr(to_sqm, 'convert') and callable(getattr(to_sqm, 'convert')):
-                r['area_sqm'] = to_sqm.convert(area, unit)
-            elif hasattr(to_sqm, 'to_square_meters') and callable(getattr(to_sqm, 'to_square_meters')):
-                r['area_sqm'] = to_sqm.to_square_meters(area, unit)
-            else:
-                # unknown shape (module without expected callable); try a safe fallback
-                try:
-                    r['area_sqm'] = float(area)
-                except Exception:
-                    r['area_sqm'] = None
+            r['area_sqm'] = area_sqm
+
+    # One pydantic-core call for the whole list; failed records come back as None
+    validated: List[Any]
+    try:
+        validated = validate_listings(recs)
+    except Exception as e:
+        _emit({"event": "validation_error", "phase": "pre_llm", "error": str(e)})
+        validated = [validate_listing(r) for r in recs]
+
+    # LLM fallback for records that failed validation: the raw HTML read and the Ollama call
+    # of several records are in flight at once instead of strictly one after the other.
+    if extractor is not None:
+        pending = [i for i, v in enumerate(validated) if v is None]
+        llm_attempts = len(pending)
+        if pending:
+            with ThreadPoolExecutor(max_workers=min(llm_workers, len(pending))) as executor:
+                results = executor.map(_llm_fallback, [extractor] * len(pending), [recs[i] for i in pending])
+                for i, (had_html, out) in zip(pending, results):
+                    if out is not None:
+                        llm_success += 1
+                        validated[i] = out
+                    elif had_html:
+                        _emit({"event": "llm_fallback_failed", "url": recs[i].get('url')})
+
+    # Records stay Listing models through geocoding; they are dumped to dicts once, in one batch, for dedupe/SQL
+    cleaned = [v for v in validated if v is not None]
+
+    # Addresses resolved on previous runs are served from disk instead of the geocoding API
+    geocode = geocode_address
+    geocode_cache = None
+    try:
+        # Default geocoder raises on transport/HTTP errors, so only real misses get cached
+        geocode_cache = GeocodeCache()
+        geocode = geocode_cache.geocode
+    except Exception as e:
+        _emit({"event": "geocode_cache_error", "error": str(e)})
+
+    neighborhoods = None
+    gj_path = Path('config/neighborhoods.geojson')
+    if gj_path.exists():
+        # Parse and index the polygons once; each record is then an STRtree query
         try:
-            # validate_listing may be a direct callable, or a module exposing a function.
-            if callable(validate_listing):
-                v = validate_listing(r)
-            elif hasattr(validate_listing, 'validate_listing') and callable(getattr(validate_listing, 'validate_listing')):
-                v = validate_listing.validate_listing(r)
-            elif hasattr(validate_listing, 'validate') and callable(getattr(validate_listing, 'validate')):
-                v = validate_listing.validate(r)
-            else:
-                # As a last resort try importing the expected function directly from the module.
-                mod = _import("extractor.schema")
-                func = getattr(mod, "validate_listing", None)
-                if callable(func):
-                    v = func(r)
-                else:
-                    raise TypeError("validate_listing is not callable")
+            neighborhoods = NeighborhoodIndex.from_geojson(str(gj_path))
         except Exception as e:
-            v = None
-            print(orjson.dumps({"event": "validation_error", "phase": "pre_llm", "url": r.get('url'), "error": str(e)}).decode())
-
-        if v is None and extractor is not None:
-            llm_attempts += 1
-            html = None
-            raw_path = r.get('raw_html_path')
-            try:
-                if raw_path and Path(raw_path).exists():
-                    html = Path(raw_path).read_text(encoding='utf-8', errors='ignore')
-            except Exception:
-                html = None
-            if html:
-                out = extractor.extract(url=r.get('url', ''), title=r.get('title'), html=html)
-                if out is not None:
-                    llm_success += 1
-                    v = out
-                else:
-                    print(orjson.dumps({"event": "llm_fallback_failed", "url": r.get('url')}).decode())
-
-        if v is not None:
-            # Accept pydantic v2 (model_dump) or v1 (dict), dataclasses, plain dicts, or objects with __dict__
-            _method = getattr(v, "model_dump", None)
-            if callable(_method):
-                cleaned.append(_method())
-            else:
-                _method = getattr(v, "dict", None)
-                if callable(_method):
-                    cleaned.append(_method())
-                elif isinstance(v, dict):
-                    cleaned.append(v)
-                else:
-                    try:
-                        import dataclasses as _dc
-                        # Only call asdict on dataclass instances, not on dataclass types
-                        if _dc.is_dataclass(v) and not isinstance(v, type):
-                            cleaned.append(_dc.asdict(v))
-                        elif _dc.is_dataclass(v) and isinstance(v, type):
-                            # Convert a dataclass type to a dict of default values (or None if missing)
-                            defaults = {}
-                            for f in getattr(v, "__dataclass_fields__", {}).values():
-                                name = f.name
-                                if f.default is not _dc.MISSING:
-                                    defaults[name] = f.default
-                                elif getattr(f, "default_factory", _dc.MISSING) is not _dc.MISSING:
-                                    try:
-                                        defaults[name] = f.default_factory()
-                                    except Exception:
-                                        defaults[name] = None
-                                else:
-                                    defaults[name] = None
-                            cleaned.append(defaults)
-                        else:
-                            # try to get a dict-like representation from the object
-                            cleaned.append(vars(v))
-                    except Exception:
-                        # final fallback: append the raw value
-                        cleaned.append(v)
+            _emit({"event": "neighborhood_error", "path": str(gj_path), "error": str(e)})
 
+    # Single pass: geocode missing coordinates, then resolve the neighborhood while the record is hot
     for r in cleaned:
-        if not r.get('latitude') and r.get('address'):
+        if not r.latitude and r.address:
             gc = None
             try:
-                if callable(geocode_address):
-                    gc = geocode_address(r['address'])
-                elif hasattr(geocode_address, 'geocode_address') and callable(getattr(geocode_address, 'geocode_address')):
-                    gc = geocode_address.geocode_address(r['address'])
-                elif hasattr(geocode_address, 'geocode') and callable(getattr(geocode_address, 'geocode')):
-                    gc = geocode_address.geocode(r['address'])
-                else:
-                    # As a last resort try importing the expected function directly from the module.
-                    mod = _import("etl.geocode")
-                    func = getattr(mod, "geocode_address", None) or getattr(mod, "geocode", None)
-                    if callable(func):
-                        gc = func(r['address'])
-                    else:
-                        raise TypeError("geocode_address is not callable")
+                gc = geocode(r.address)
             except Exception as e:
-                print(orjson.dumps({"event": "geocode_error", "address": r.get('address'), "error": str(e)}).decode())
+                _emit({"event": "geocode_error", "address": r.address, "error": str(e)})
                 gc = None
             if gc:
                 # Accept a variety of shapes from geocode: (lat, lon), [lat, lon], {'lat':..,'lon':..}, {'latitude':..,'longitude':..}
@@ -239,138 +214,41 @@ def main() -> None:
                     lat = lon = None
 
                 if lat is not None and lon is not None:
-                    r['latitude'] = lat
-                    r['longitude'] = lon
+                    r.latitude = lat
+                    r.longitude = lon
 
-    gj_path = Path('config/neighborhoods.geojson')
-    if gj_path.exists():
-        for r in cleaned:
-            if r.get('latitude') and r.get('longitude'):
-                try:
-                    if callable(neighborhood_from_geojson):
-                        n = neighborhood_from_geojson(r['latitude'], r['longitude'], str(gj_path))
-                    elif hasattr(neighborhood_from_geojson, 'neighborhood_from_geojson') and callable(getattr(neighborhood_from_geojson, 'neighborhood_from_geojson')):
-                        n = neighborhood_from_geojson.neighborhood_from_geojson(r['latitude'], r['longitude'], str(gj_path))
-                    elif hasattr(neighborhood_from_geojson, 'from_geojson') and callable(getattr(neighborhood_from_geojson, 'from_geojson')):
-                        n = neighborhood_from_geojson.from_geojson(r['latitude'], r['longitude'], str(gj_path))
-                    else:
-                        mod = _import("etl.geocode")
-                        func = getattr(mod, "neighborhood_from_geojson", None) or getattr(mod, "from_geojson", None)
-                        if callable(func):
-                            n = func(r['latitude'], r['longitude'], str(gj_path))
-                        else:
-                            raise TypeError("neighborhood_from_geojson is not callable")
-                except Exception as e:
-                    print(orjson.dumps({"event": "neighborhood_error", "lat": r.get('latitude'), "lon": r.get('longitude'), "error": str(e)}).decode())
-                    n = None
-                if n:
-                    r['neighborhood'] = n
+        # Records already tagged (by the scraper or a previous run) keep their neighborhood
+        if neighborhoods is not None and not r.neighborhood and r.latitude and r.longitude:
+            try:
+                n = neighborhoods.lookup(r.latitude, r.longitude)
+            except Exception as e:
+                _emit({"event": "neighborhood_error", "lat": r.latitude, "lon": r.longitude, "error": str(e)})
+                n = None
+            if n:
+                r.neighborhood = n
+
+    if geocode_cache is not None:
+        geocode_cache.close()
+
+    cleaned_records = dump_listings(cleaned)
 
     try:
-        if callable(dedupe_records):
-            deduped = dedupe_records(cleaned)
-        elif hasattr(dedupe_records, 'dedupe_records') and callable(getattr(dedupe_records, 'dedupe_records')):
-            deduped = dedupe_records.dedupe_records(cleaned)
-        elif hasattr(dedupe_records, 'dedupe') and callable(getattr(dedupe_records, 'dedupe')):
-            deduped = dedupe_records.dedupe(cleaned)
-        else:
-            # As a last resort try importing the expected function directly from the module.
-            mod = _import("etl.dedupe")
-            func = getattr(mod, "dedupe_records", None) or getattr(mod, "dedupe", None)
-            if callable(func):
-                deduped = func(cleaned)
-            else:
-                raise TypeError("dedupe_records is not callable")
+        deduped = dedupe_records(cleaned_records)
     except Exception as e:
-        print(orjson.dumps({"event": "dedupe_error", "error": str(e)}).decode())
+        _emit({"event": "dedupe_error", "error": str(e)})
         # On error, fall back to using the cleaned list as-is
-        deduped = cleaned
-
-    # Ensure we have a list-like value for sizing and further processing so type checkers are satisfied.
-    if isinstance(deduped, list):
-        final_deduped = deduped
-    else:
-        # If deduped isn't a list, fall back to cleaned (which is a list), or try to coerce if it's iterable.
-        if isinstance(cleaned, list):
-            final_deduped = cleaned
-        else:
-            try:
-                if hasattr(deduped, '__iter__') and not isinstance(deduped, (str, bytes)):
-                    # cast to Iterable[Any] so static type checkers accept passing to list(...)
-                    final_deduped = list(cast(Iterable[Any], deduped))
-                else:
-                    final_deduped = [deduped]
-            except Exception:
-                final_deduped = list(cleaned)
-
-    report = {"total": total, "cleaned": len(cleaned), "deduped": len(final_deduped), "llm_attempts": llm_attempts, "llm_success": llm_success}
-    Path('data/report.json').write_text(orjson.dumps(report).decode())
-    print(orjson.dumps({"event": "report", "report": report}).decode())
-
-    from etl.load_d1 import generate_upsert_sql
+        deduped = cleaned_records
 
-    # Coerce final_deduped into a List[Dict[str, Any]] so the generate_upsert_sql signature is satisfied.
-    listings: List[Dict[str, Any]] = []
-    for item in final_deduped:
-        if isinstance(item, dict):
-            listings.append(item)
-            continue
+    report = {"total": total, "cleaned": len(cleaned), "deduped": len(deduped), "llm_attempts": llm_attempts, "llm_success": llm_success}
+    Path('data/report.json').write_text(orjson.dumps(report).decode())
+    _emit({"event": "report", "report": report})
 
-        # Try common conversions: dataclass -> asdict, mapping -> dict(item), vars(...)
-        converted = None
-        try:
-            import dataclasses as _dc
-            if _dc.is_dataclass(item) and not isinstance(item, type):
-                converted = _dc.asdict(item)
-        except Exception:
-            converted = None
-        if converted is None:
-            try:
-                # Prefer Mapping (safe)
-                if isinstance(item, Mapping):
-                    converted = dict(item)
-                else:
-                    # If it has an items() method but isn't a Mapping, retrieve it via getattr and ensure it's callable
-                    items_attr = getattr(item, "items", None)
-                    if callable(items_attr):
-                        try:
-                            # Cast the callable to a zero-argument callable that returns an iterable of pairs,
-                            # so static type checkers accept dict(...) call.
-                            items_callable = cast(Callable[[], Iterable[Any]], items_attr)
-                            res = items_callable()
-                            if hasattr(res, "__iter__"):
-                                converted = dict(res)
-                            else:
-                                converted = None
-                        except Exception:
-                            converted = None
-                    else:
-                        # Only attempt dict(item) if it's an actual iterable of pairs and not a str/bytes
-                        if hasattr(item, "__iter__") and not isinstance(item, (str, bytes, bytearray)):
-                            try:
-                                # Tell the type checker we intend this to be an iterable of pairs.
-                                converted = dict(cast(Iterable[Any], item))
-                            except Exception:
-                                converted = None
-                        else:
-                            converted = None
-            except Exception:
-                converted = None
+    from etl.load_d1 import generate_upsert_sql_iter
 
-        if converted is None:
-            try:
-                converted = vars(item)
-            except Exception:
-                converted = None
-
-        if isinstance(converted, dict):
-            listings.append(converted)
-        else:
-            # Last resort: store the raw value under a key to preserve data
-            listings.append({"value": item})
-
-    sql = generate_upsert_sql(listings)
-    Path('data/upload.sql').write_text(sql)
+    # Stream the SQL one statement at a time through a 1 MB buffer instead of building the whole script
+    with open('data/upload.sql', 'wb', buffering=1 << 20) as f:
+        for chunk in generate_upsert_sql_iter(deduped):
+            f.write(chunk)
 
 
 if __name__ == '__main__':
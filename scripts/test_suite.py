@@ -190,7 +190,7 @@ class TestRunner:
         ], timeout=60)
         
         # Vérifier fichiers debug générés
-        debug_files = list(Path("logs").glob("debug_*.html")) + list(Path("logs").glob("debug_*.png"))
+        debug_files = [f for ext in ("html", "mhtml", "png", "jpg") for f in Path("logs").glob(f"debug_*.{ext}")]
         
         if len(debug_files) > 0:
             self.log(f"✅ Mode debug OK: {len(debug_files)} fichiers générés", Colors.GREEN)
@@ -199,6 +199,40 @@ class TestDeduplication:
         result = dedupe_records(listings)
         assert len(result) == 1
         assert result[0]['extra_field'] == 'first'
+    
+    def test_dedupe_records_matches_listing_hash(self):
+        """Test that batch deduplication keeps exactly one listing per hash."""
+        listings = [
+            {'url': 'https://example.com/1 ', 'price': 100000},
+            {'url': 'https://EXAMPLE.com/1', 'price': 100000},  # same hash as above
+            {'url': 'https://example.com/1', 'price': 100000.0},  # '100000.0' != '100000'
+            {'url': 'https://example.com/1', 'price': None, 'title': 'Loft'},
+            {'url': 'https://example.com/1', 'title': 'loft'},  # None is skipped like a missing field
+            {'url': 'https://example.com/1', 'balcony': True},  # non-key field
+            {}
+        ]
+        
+        result = dedupe_records(listings)
+        
+        seen = set()
+        expected = []
+        for listing in listings:
+            listing_hash = generate_listing_hash(listing)
+            if listing_hash not in seen:
+                seen.add(listing_hash)
+                expected.append(listing)
+        assert result == expected
+        assert len(result) == 5
+    
+    def test_dedupe_records_nan_values(self):
+        """Test that NaN field values do not make distinct listings collide."""
+        listings = [
+            {'url': 'a', 'price': float('nan')},
+            {'url': 'b', 'price': float('nan')},
+            {'url': 'b', 'price': float('nan')}  # same hash as above
+        ]
+        
+        assert dedupe_records(listings) == listings[:2]
 
 
 class TestDuplicateDetection:
@@ -0,0 +1,94 @@
+"""
+Tests for ETL geocoding module.
+Tests neighborhood lookup against GeoJSON polygons.
+"""
+
+import json
+
+import pytest
+
+from etl import geocode
+from etl.geocode import GeocodeCache, NeighborhoodIndex, neighborhood_from_geojson
+
+
+def _square(x0, y0, x1, y1):
+    return {"type": "Polygon", "coordinates": [[[x0, y0], [x1, y0], [x1, y1], [x0, y1], [x0, y0]]]}
+
+
+@pytest.fixture
+def neighborhoods_geojson(tmp_path):
+    """GeoJSON with two overlapping named squares and one unnamed square."""
+    collection = {
+        "type": "FeatureCollection",
+        "features": [
+            {"type": "Feature", "properties": {"nom": "Plateau"}, "geometry": _square(0, 0, 2, 2)},
+            {"type": "Feature", "properties": {"name": "Mile End"}, "geometry": _square(1, 1, 3, 3)},
+            {"type": "Feature", "properties": {"code": "X"}, "geometry": _square(5, 5, 6, 6)},
+        ],
+    }
+    path = tmp_path / "neighborhoods.geojson"
+    path.write_text(json.dumps(collection), encoding="utf-8")
+    return path
+
+
+@pytest.mark.parametrize("use_strtree", [True, False])
+def test_neighborhood_index_lookup(neighborhoods_geojson, monkeypatch, use_strtree):
+    """Lookup returns the first matching named polygon, with or without shapely."""
+    if not use_strtree:
+        monkeypatch.setattr(geocode, "STRtree", None)
+    elif geocode.STRtree is None:
+        pytest.skip("shapely not installed")
+
+    index = NeighborhoodIndex.from_geojson(str(neighborhoods_geojson))
+
+    # GeoJSON coordinates are (lon, lat); lookup takes (lat, lon)
+    assert index.lookup(0.5, 0.5) == "Plateau"
+    assert index.lookup(1.5, 1.5) == "Plateau"  # overlap: file order wins
+    assert index.lookup(2.5, 2.5) == "Mile End"
+    assert index.lookup(5.5, 5.5) is None  # polygon without a name property
+    assert index.lookup(10, 10) is None
+
+
+def test_neighborhood_from_geojson_uses_file(neighborhoods_geojson, tmp_path):
+    """The path-based helper resolves through the cached index."""
+    assert neighborhood_from_geojson(2.5, 2.5, str(neighborhoods_geojson)) == "Mile End"
+    assert neighborhood_from_geojson(2.5, 2.5, str(tmp_path / "missing.geojson")) is None
+
+
+def test_geocode_cache_persists_hits_and_misses(tmp_path):
+    """Repeated addresses, including unresolved ones, only reach the geocoder once."""
+    calls = []
+
+    def fake_geocoder(address):
+        calls.append(address)
+        return (48.85, 2.35) if "paris" in address.lower() else None
+
+    cache_dir = str(tmp_path / "geocode_cache")
+    with GeocodeCache(cache_dir, geocoder=fake_geocoder) as cache:
+        assert cache.geocode("Paris, France") == (48.85, 2.35)
+        assert cache.geocode("  paris,   FRANCE ") == (48.85, 2.35)
+        assert cache.geocode("Nowhere") is None
+        assert cache.geocode("nowhere") is None
+
+    with GeocodeCache(cache_dir, geocoder=fake_geocoder) as cache:
+        assert cache.geocode("PARIS, France") == (48.85, 2.35)
+
+    assert calls == ["Paris, France", "Nowhere"]
+
+
+def test_geocode_cache_skips_failed_lookups(tmp_path):
+    """Geocoder errors (timeouts, rate limits) are not cached as misses."""
+    calls = []
+
+    def flaky_geocoder(address):
+        calls.append(address)
+        if len(calls) == 1:
+            raise TimeoutError("read timed out")
+        return (48.85, 2.35)
+
+    with GeocodeCache(str(tmp_path / "geocode_cache"), geocoder=flaky_geocoder) as cache:
+        assert cache.geocode("Paris, France") is None
+        assert cache.geocode("Paris, France") == (48.85, 2.35)
+        assert cache.geocode("Paris, France") == (48.85, 2.35)
+
+    assert len(calls) == 2
@@ -15,7 +15,9 @@ from etl.normalize import (
     to_square_meters,
     convert,
     normalize_price,
-    normalize_address
+    normalize_address,
+    to_sqm_many,
+    normalize_currency_many
 )
 
 
@@ -193,3 +195,29 @@ class TestIntegrationScenarios:
         assert normalize_currency("") == "EUR"
         assert normalize_price("") is None
         assert normalize_address("") is None
+
+
+class TestColumnNormalization:
+    """Test column-wise normalization matches the scalar functions."""
+    
+    def test_to_sqm_many_matches_to_sqm(self):
+        """Test batch area conversion against row-by-row conversion."""
+        areas = [100, "1000", None, 0, "abc", 50, 7.5, 2, 3, "12"]
+        units = ["sqft", "sqm", "sqm", "sqm", "sqm", None, "ha", "unknown", "acres", " M² "]
+        assert to_sqm_many(areas, units) == [to_sqm(a, u) for a, u in zip(areas, units)]
+    
+    def test_to_sqm_many_half_cent_rounding(self):
+        """Test that batch conversion rounds half-cent products like round()."""
+        areas = [3892.435, 1836.25, 0.125, 2.675]
+        units = ["sqm", "acres", "sqm", "sqm"]
+        assert to_sqm_many(areas, units) == [to_sqm(a, u) for a, u in zip(areas, units)]
+        assert to_sqm_many([3892.435], ["sqm"]) == [3892.43]
+    
+    def test_to_sqm_many_empty(self):
+        """Test batch area conversion of empty columns."""
+        assert to_sqm_many([], []) == []
+    
+    def test_normalize_currency_many_matches_normalize_currency(self):
+        """Test batch currency normalization against row-by-row normalization."""
+        currencies = ["€", None, "usd", "Dollars US", "xyz", "", "€", "CHF"]
+        assert normalize_currency_many(currencies) == [normalize_currency(c) for c in currencies]
@@ -12,6 +12,8 @@ from etl.schema import (
     Listing,
     validate_listing,
     validate_batch,
+    validate_listings,
+    dump_listings,
     get_validation_stats
 )
 
@@ -264,6 +266,36 @@ class TestValidationFunctions:
         result = validate_batch(listings_data)
         assert len(result) == 5
         assert all(isinstance(listing, Listing) for listing in result)
+    
+    def test_validate_listings_keeps_positions(self):
+        """Test list validation returns None in place of each invalid record."""
+        listings_data: List[Any] = [
+            {"url": "https://example.com/1", "price": "not a number"},
+            {"url": "https://example.com/2", "price": 100000.0},
+            "not a dict",
+            {"url": "   "},
+            {"url": "https://example.com/5"}
+        ]
+        
+        result = validate_listings(listings_data)
+        
+        assert [listing is not None for listing in result] == [False, True, False, False, True]
+        assert result[1].price == 100000.0
+        assert result[4].url == "https://example.com/5"
+        assert isinstance(result[4].scraped_at, datetime)
+    
+    def test_dump_listings_drops_none_fields(self):
+        """Test batch dump back to dictionaries keeps set values and extra fields."""
+        listings = [
+            Listing(url="https://example.com/1", price=100000.0, agency="Acme"),
+            Listing(url="https://example.com/2")
+        ]
+        listings[1].neighborhood = "Plateau"
+        
+        result = dump_listings(listings)
+        
+        assert result[0] == {"url": "https://example.com/1", "price": 100000.0, "currency": "EUR", "agency": "Acme"}
+        assert result[1] == {"url": "https://example.com/2", "currency": "EUR", "neighborhood": "Plateau"}
 
 
 class TestValidationStats:
@@ -164,6 +164,107 @@ class TestDataExtraction:
         assert True  # Placeholder
 
 
+class TestCleanScraperHelpers:
+    """Test pure helpers of the production clean scraper."""
+
+    @pytest.fixture
+    def scraper_cls(self):
+        pytest.importorskip("playwright")
+        from scraper.spiders.clean_scraper import RealEstateScraper
+        return RealEstateScraper
+
+    def test_build_search_url_paths(self, scraper_cls):
+        """Test URL building for the main where/what combinations."""
+        assert scraper_cls.build_search_url("Lachine", "condo", "all") == \
+            "https://www.realtor.ca/qc/montreal/lachine/condos-for-sale"
+        assert scraper_cls.build_search_url("Laval", "rent", "all") == \
+            "https://www.realtor.ca/qc/laval/real-estate-for-rent"
+        assert scraper_cls.build_search_url("x", "y", "all", "https://example.com/s") == \
+            "https://example.com/s"
+
+    def test_build_search_url_is_cached(self, scraper_cls):
+        """Test repeated calls are served from the memo cache."""
+        scraper_cls.build_search_url.cache_clear()
+        scraper_cls.build_search_url("montreal", "condo", "all")
+        scraper_cls.build_search_url("montreal", "condo", "all")
+        assert scraper_cls.build_search_url.cache_info().hits == 1
+
+    def test_realtor_build_search_url(self):
+        """Test the realtor XHR URL builder prefixes the province and is memoized."""
+        pytest.importorskip("playwright")
+        from scraper.spiders.realtor_xhr import RealtorXHRScraper
+        RealtorXHRScraper.build_search_url.cache_clear()
+        url = RealtorXHRScraper.build_search_url("Montreal/Lachine", "condos-for-sale")
+        assert url == "https://www.realtor.ca/qc/montreal/lachine/condos-for-sale"
+        RealtorXHRScraper.build_search_url("Montreal/Lachine", "condos-for-sale")
+        assert RealtorXHRScraper.build_search_url.cache_info().hits == 1
+
+    def test_normalize_slug(self):
+        """Test slug normalization matches the lower/replace/strip chain."""
+        pytest.importorskip("playwright")
+        from scraper.spiders.clean_scraper import normalize_slug
+        for raw in ["Montreal/Lachine", "/Saint Laurent/", "ÎLE Bizard", "condo"]:
+            assert normalize_slug(raw) == raw.lower().replace(" ", "-").strip("/")
+
+    def test_normalize_listing_price_spaces(self, scraper_cls):
+        """Test prices with regular and (narrow) no-break thousand separators."""
+        scraper = scraper_cls()
+        for raw in ["$1,250,000", "450 000 $", "450\u00a0000\u00a0$", "450\u202f000 $"]:
+            normalized = scraper.normalize_listing({"price_raw": raw})
+            assert normalized["price"] in (1250000, 450000)
+        assert scraper.normalize_listing({"price_raw": "Prix sur demande"}) is None
+
+    def test_extract_static_listing(self, scraper_cls):
+        """Test selectolax-based extraction of a listing card."""
+        from scraper.spiders.clean_scraper import HTMLParser, extract_static_listing
+        if HTMLParser is None:
+            pytest.skip("selectolax not installed")
+        html = (
+            '<div class="listing-card"><span class="price">$450,000</span>'
+            '<div class="address">123 Rue Notre-Dame, Lachine</div>'
+            '<a href="/listing/1">View</a><span class="beds">3 bd</span></div>'
+        )
+        node = HTMLParser(html).css_first('[class*="listing-card"]')
+        data = extract_static_listing(node, "https://www.realtor.ca/qc/lachine")
+        assert data == {
+            "price_raw": "$450,000",
+            "address": "123 Rue Notre-Dame, Lachine",
+            "url": "https://www.realtor.ca/listing/1",
+            "bedrooms": 3,
+        }
+
+    def test_waf_regex_case_insensitive(self):
+        """Test WAF signatures match regardless of case and map to a reason."""
+        pytest.importorskip("playwright")
+        from scraper.spiders.clean_scraper import WAF_PATTERNS, _WAF_RE, first_match
+        hit = first_match("<title>Attention Required! | CloudFlare</title>", _WAF_RE)
+        assert WAF_PATTERNS[hit][1] == "Cloudflare protection"
+        assert first_match("<html><body>3 bedroom condo</body></html>", _WAF_RE) is None
+
+    def test_realtor_listings_at_paths(self):
+        """Test listing arrays are found along nested key paths only when non-empty."""
+        pytest.importorskip("playwright")
+        from scraper.spiders.realtor_xhr import LISTING_PATHS, listings_at
+        payload = {"Results": [], "data": {"listings": [{"Id": "1"}]}}
+        found = [listings_at(payload, path) for path in LISTING_PATHS]
+        assert found == [None, None, [{"Id": "1"}], None]
+        assert listings_at({"data": []}, ("data", "listings")) is None
+
+    def test_query_outputs_unique_per_source(self):
+        """Test batch queries sharing a source get distinct output file names."""
+        pytest.importorskip("playwright")
+        from scraper.spiders.clean_scraper import query_outputs
+        queries = [
+            {"where": "Montreal", "what": "condo"},
+            {"where": "Laval", "what": "house"},
+            {"where": "Laval", "what": "house"},
+            {"source": "mock", "where": "demo", "what": "test"},
+        ]
+        assert query_outputs(queries) == [
+            "realtor-montreal-condo", "realtor-laval-house", "realtor-laval-house-2", "mock"
+        ]
+
+
 class TestScraperIntegration:
     """Integration tests for complete scraper workflow."""
     